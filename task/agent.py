@@ -12,12 +12,18 @@ from aidial_sdk.chat_completion import (
     ToolCall,
 )
 from openai.types.chat import ChatCompletionChunk
-from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall
 from tools.base import BaseTool
 from tools.models import ToolCallParams
 from utils.constants import TOOL_CALL_HISTORY_KEY
+from utils.dial_client_registry import DialClientRegistry
 from utils.history import unpack_messages
-from utils.stage import StageProcessor
+from utils.metrics import TOOL_ROUNDS, observe_llm_stream
+from utils.stage import BufferedChoice, StageProcessor
+from utils.streaming_tool_call import StreamingToolCall
+from utils.structured_logging import get_logger
+from utils.tracing import tracer
+
+logger = get_logger("agent")
 
 
 class GeneralPurposeAgent:
@@ -26,87 +32,208 @@ class GeneralPurposeAgent:
         endpoint: str,
         system_prompt: str,
         tools: list[BaseTool],
+        client_registry: DialClientRegistry,
+        max_iterations: int = 10,
+        time_budget_seconds: float = 300.0,
     ):
+        """
+        Args:
+            endpoint: DIAL Core URL
+            system_prompt: System prompt of the LLM
+            tools: Tools available to the LLM
+            client_registry: Source of the pooled DIAL clients
+            max_iterations: Max tool-calling rounds per request
+            time_budget_seconds: Time after which no more tool-calling rounds are started
+        """
         self.endpoint = endpoint
         self.system_prompt = system_prompt
         self.tools = tools
         self.tools_dict = {tool.name: tool for tool in tools}
+        self.client_registry = client_registry
+        self.max_iterations = max_iterations
+        self.time_budget_seconds = time_budget_seconds
         self.state = {TOOL_CALL_HISTORY_KEY: []}
 
     async def handle_request(
         self, deployment_name: str, choice: Choice, request: Request, response: Response
     ) -> Message:
-        dial = AsyncDial(
-            base_url=self.endpoint,
+        """
+        Run LLM rounds until the LLM answers without tool calls.
+
+        Every round streams an LLM completion and executes the requested tool calls concurrently,
+        each one starting as soon as the LLM has streamed its arguments.
+        When `max_iterations` rounds are done or the time budget is spent, one more round is run with
+        tool calls disabled, so the LLM answers with what it has. Tool calls still running when the
+        time budget runs out are cancelled and reported to the LLM as such.
+        """
+        dial = self.client_registry.get_async_client(
+            endpoint=self.endpoint,
             api_key=request.api_key,
             api_version=request.api_version,
         )
+        # Tools get the same buffered choice, so their choice events stay in order with the content
+        buffered_choice = BufferedChoice(choice)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.time_budget_seconds
+        iteration = 0
+
+        try:
+            while True:
+                is_final = iteration >= self.max_iterations or loop.time() >= deadline
+                if is_final and iteration > 0:
+                    logger.info(
+                        "tool_calls_stopped",
+                        rounds=iteration,
+                        elapsed_seconds=round(
+                            self.time_budget_seconds - (deadline - loop.time()), 1
+                        ),
+                    )
+
+                with tracer.span(
+                    "llm_round", iteration=iteration, deployment=deployment_name
+                ) as span:
+                    assistant_message, tool_tasks = await self._stream_completion(
+                        dial=dial,
+                        deployment_name=deployment_name,
+                        choice=buffered_choice,
+                        request=request,
+                        allow_tool_calls=not is_final,
+                    )
+                    span.set_attribute("tool_calls", len(assistant_message.tool_calls))
+
+                if is_final or not assistant_message.tool_calls:
+                    buffered_choice.set_state(self.state)
+                    return assistant_message
+
+                tool_messages = await self._collect_tool_messages(
+                    tool_calls=assistant_message.tool_calls,
+                    tasks=tool_tasks,
+                    timeout=max(deadline - loop.time(), 0),
+                )
+
+                self.state[TOOL_CALL_HISTORY_KEY].append(
+                    assistant_message.dict(exclude_none=True)
+                )
+                self.state[TOOL_CALL_HISTORY_KEY].extend(tool_messages)
+                iteration += 1
+        finally:
+            # Failed and cancelled requests are counted with the rounds they completed
+            TOOL_ROUNDS.observe(iteration)
+            buffered_choice.flush()
+
+    async def _stream_completion(
+        self,
+        dial: AsyncDial,
+        deployment_name: str,
+        choice: BufferedChoice,
+        request: Request,
+        allow_tool_calls: bool,
+    ) -> tuple[Message, list[asyncio.Task]]:
+        """
+        Stream an LLM completion to the choice, starting every tool call as soon as its arguments are
+        complete, while the LLM is still streaming the next ones.
 
-        chunks: AsyncIterable[ChatCompletionChunk] = await dial.chat.completions.create(
-            messages=self._prepare_messages(request.messages),
-            tools=[tool.schema for tool in self.tools],
-            deployment_name=deployment_name,
-            stream=True,
+        Returns:
+            Assistant message and the tool call tasks, in the order of `tool_calls` of the message
+        """
+        chunks: AsyncIterable[ChatCompletionChunk] = observe_llm_stream(
+            deployment_name,
+            dial.chat.completions.create(
+                messages=self._prepare_messages(request.messages),
+                tools=[tool.schema for tool in self.tools],
+                tool_choice="auto" if allow_tool_calls else "none",
+                deployment_name=deployment_name,
+                stream=True,
+            ),
         )
 
-        tool_call_index_map: dict[int, ChoiceDeltaToolCall] = {}
+        streaming_tool_calls: dict[int, StreamingToolCall] = {}
+        tool_calls: dict[int, ToolCall] = {}
+        tasks: dict[int, asyncio.Task] = {}
         content = ""
 
-        async for chunk in chunks:
-            if chunk.choices:
-                delta = chunk.choices[0].delta
+        def dispatch(streaming_tool_call: StreamingToolCall) -> None:
+            tool_call = streaming_tool_call.to_tool_call()
+            tool_calls[streaming_tool_call.index] = tool_call
+            if allow_tool_calls:
+                tasks[streaming_tool_call.index] = asyncio.create_task(
+                    self._process_tool_call(
+                        tool_call=tool_call,
+                        choice=choice,
+                        api_key=request.api_key,
+                        conversation_id=request.headers["x-conversation-id"],
+                    )
+                )
+
+        try:
+            async for chunk in chunks:
+                if chunk.choices:
+                    delta = chunk.choices[0].delta
 
-                if delta:
-                    if delta.content:
-                        choice.append_content(delta.content)
-                        content += delta.content
+                    if delta:
+                        if delta.content:
+                            choice.append_content(delta.content)
+                            content += delta.content
 
-                    if delta.tool_calls:
-                        for tool_call_delta in delta.tool_calls:
-                            tool_idx = tool_call_delta.index
+                        if delta.tool_calls:
+                            for tool_call_delta in delta.tool_calls:
+                                tool_idx = tool_call_delta.index
+                                function = tool_call_delta.function
 
-                            if tool_call_delta.id:
-                                tool_call_index_map[tool_idx] = tool_call_delta
-                            else:
-                                tool_call = tool_call_index_map[tool_idx]
+                                if tool_call_delta.id:
+                                    streaming_tool_calls[tool_idx] = StreamingToolCall(
+                                        index=tool_idx,
+                                        id=tool_call_delta.id,
+                                        name=function.name if function else None,
+                                    )
 
-                                argument_chunk = ""
-                                if tool_call_delta.function:
-                                    argument_chunk = tool_call_delta.function.arguments
+                                streaming_tool_call = streaming_tool_calls[tool_idx]
+                                if function:
+                                    if function.name and not streaming_tool_call.name:
+                                        streaming_tool_call.name = function.name
+                                    if streaming_tool_call.append_arguments(function.arguments):
+                                        dispatch(streaming_tool_call)
 
-                                tool_call.function.arguments += argument_chunk
+            # Tool calls without a complete JSON object, e.g. with empty arguments
+            for tool_idx, streaming_tool_call in streaming_tool_calls.items():
+                if tool_idx not in tool_calls:
+                    dispatch(streaming_tool_call)
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
 
+        order = sorted(streaming_tool_calls)
         assistant_message = Message(
             role=Role.ASSISTANT,
             content=content,
-            tool_calls=[
-                ToolCall.validate(tool) for tool in tool_call_index_map.values()
-            ],
+            tool_calls=[tool_calls[tool_idx] for tool_idx in order],
         )
 
-        if assistant_message.tool_calls:
-            tasks = [
-                self._process_tool_call(
-                    tool_call=tool,
-                    choice=choice,
-                    api_key=request.api_key,
-                    conversation_id=request.headers["x-conversation-id"],
-                )
-                for tool in assistant_message.tool_calls
-            ]
-
-            tool_messages = await asyncio.gather(*tasks)
-
-            self.state[TOOL_CALL_HISTORY_KEY].append(
-                assistant_message.dict(exclude_none=True)
-            )
-            self.state[TOOL_CALL_HISTORY_KEY].extend(tool_messages)
+        return assistant_message, [tasks[tool_idx] for tool_idx in order if tool_idx in tasks]
 
-            return await self.handle_request(deployment_name, choice, request, response)
+    async def _collect_tool_messages(
+        self, tool_calls: list[ToolCall], tasks: list[asyncio.Task], timeout: float
+    ) -> list[dict[str, Any]]:
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-        choice.set_state(self.state)
+        tool_messages = []
+        for tool_call, task in zip(tool_calls, tasks):
+            if task in pending or task.cancelled():
+                message = Message(
+                    role=Role.TOOL,
+                    name=tool_call.function.name,
+                    tool_call_id=tool_call.id,
+                    content="Tool call was cancelled: the request time budget is exhausted",
+                )
+                tool_messages.append(message.dict(exclude_none=True))
+            else:
+                tool_messages.append(task.result())
 
-        return assistant_message
+        return tool_messages
 
     def _prepare_messages(self, messages: list[Message]) -> list[dict[str, Any]]:
         unpacked_msgs = unpack_messages(
@@ -116,38 +243,45 @@ class GeneralPurposeAgent:
             0, {"role": Role.SYSTEM.value, "content": self.system_prompt}
         )
 
-        print("Message history 📚️:")
-        for msg in unpacked_msgs:
-            print(json.dumps(msg, indent=4))
+        # Serialized and truncated by the formatter, only if debug logging is on for this request
+        logger.debug("message_history", count=len(unpacked_msgs), messages=unpacked_msgs)
 
         return unpacked_msgs
 
+    @staticmethod
+    def _format_arguments(arguments: str) -> str:
+        try:
+            return f"```json\n\r{json.dumps(json.loads(arguments), indent=2)}\n\r```\n\r"
+        except ValueError:
+            # Arguments that never formed a complete JSON object are shown as streamed
+            return f"```text\n\r{arguments}\n\r```\n\r"
+
     async def _process_tool_call(
-        self, tool_call: ToolCall, choice: Choice, api_key: str, conversation_id: str
+        self, tool_call: ToolCall, choice: BufferedChoice, api_key: str, conversation_id: str
     ) -> dict[str, Any]:
         tool_name = tool_call.function.name
 
-        stage = StageProcessor.open_stage(choice, tool_name)
-
-        tool = self.tools_dict[tool_name]
-
-        if tool.show_in_stage:
-            stage.append_content("## Request arguments: \n")
-            stage.append_content(
-                f"```json\n\r{json.dumps(json.loads(tool_call.function.arguments), indent=2)}\n\r```\n\r"
-            )
-            stage.append_content("## Response: \n")
-
-        message = await tool.execute(
-            ToolCallParams(
-                tool_call=tool_call,
-                stage=stage,
-                choice=choice,
-                api_key=api_key,
-                conversation_id=conversation_id,
-            )
-        )
+        with tracer.span("tool_call", tool=tool_name, tool_call_id=tool_call.id):
+            stage = StageProcessor.open_stage(choice, tool_name)
+
+            tool = self.tools_dict[tool_name]
 
-        StageProcessor.close_stage_safely(stage)
+            if tool.show_in_stage:
+                stage.append_content("## Request arguments: \n")
+                stage.append_content(self._format_arguments(tool_call.function.arguments))
+                stage.append_content("## Response: \n")
+
+            try:
+                message = await tool.execute(
+                    ToolCallParams(
+                        tool_call=tool_call,
+                        stage=stage,
+                        choice=choice,
+                        api_key=api_key,
+                        conversation_id=conversation_id,
+                    )
+                )
+            finally:
+                StageProcessor.close_stage_safely(stage)
 
         return message.dict(exclude_none=True)
@@ -1,4 +1,6 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 
 import uvicorn
 from agent import GeneralPurposeAgent
@@ -11,15 +13,139 @@ from tools.files.file_content_extraction_tool import FileContentExtractionTool
 from tools.mcp.mcp_client import MCPClient
 from tools.mcp.mcp_tool import MCPTool
 from tools.py_interpreter.python_code_interpreter_tool import PythonCodeInterpreterTool
-from tools.rag.rag_tool import DocumentCache, RagTool
+from tools.rag.disk_document_store import DiskDocumentStore
+from tools.rag.document_cache import DocumentCache, EvictionPolicy
+from tools.rag.embedding_backend import OnnxEmbeddingBackend, SentenceTransformerBackend
+from tools.rag.embedding_service import EmbeddingService
+from tools.rag.index_factory import RecallTarget, VectorEncoding
+from tools.rag.query_embedding_cache import QueryEmbeddingCache
+from tools.rag.rag_tool import RagTool
+from utils.dial_client_registry import DialClientRegistry
+from utils.extracted_text_cache import ExtractedTextCache
+from utils.metrics import (
+    IN_FLIGHT_REQUESTS,
+    ConnectionPoolCollector,
+    StatsCollector,
+    add_metrics_route,
+    register_collector,
+)
+from utils.startup import startup_phase, startup_timings
+from utils.structured_logging import configure_logging, get_logger, sample_request
+from utils.tracing import JsonLinesSpanExporter, tracer
+
+logger = get_logger("app")
 
 DIAL_ENDPOINT = os.getenv("DIAL_ENDPOINT", "http://localhost:8080")
+# Create tools and load models in background at startup instead of on the first request
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
 DEPLOYMENT_NAME = os.getenv("DEPLOYMENT_NAME", "gpt-4o")
+# Max tool-calling rounds and seconds per request, after which the LLM has to answer without tools
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", "10"))
+AGENT_TIME_BUDGET_SECONDS = float(os.getenv("AGENT_TIME_BUDGET_SECONDS", "300"))
+DIAL_HTTP2 = os.getenv("DIAL_HTTP2", "true").lower() == "true"
+DIAL_MAX_CONNECTIONS = int(os.getenv("DIAL_MAX_CONNECTIONS", "200"))
+DIAL_KEEPALIVE_CONNECTIONS = int(os.getenv("DIAL_KEEPALIVE_CONNECTIONS", "100"))
+DIAL_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("DIAL_KEEPALIVE_EXPIRY_SECONDS", "30"))
+# Cached DIAL clients per endpoint, API version and API key; evicted when unused for the idle TTL
+DIAL_MAX_CLIENTS = int(os.getenv("DIAL_MAX_CLIENTS", "1000"))
+DIAL_CLIENT_IDLE_TTL_SECONDS = float(os.getenv("DIAL_CLIENT_IDLE_TTL_SECONDS", "300"))
+# JSON logs to stdout; debug records (e.g. the message history) only for a sampled share of requests
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "2000"))
+# Optional JSON-lines file of request trace spans, tracing is disabled if not set
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+# Extracted file text; partially read PDFs and CSVs keep their file bytes under a separate limit
+EXTRACTED_TEXT_CACHE_MAX_CHARS = int(
+    os.getenv("EXTRACTED_TEXT_CACHE_MAX_CHARS", "50000000")
+)
+EXTRACTED_TEXT_CACHE_MAX_SOURCE_BYTES = int(
+    os.getenv("EXTRACTED_TEXT_CACHE_MAX_SOURCE_BYTES", str(2 * 1024**3))
+)
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(2 * 1024**3)))
+DOCUMENT_CACHE_TTL_SECONDS = float(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", "86400"))
+DOCUMENT_CACHE_EVICTION_POLICY = os.getenv("DOCUMENT_CACHE_EVICTION_POLICY", "lru")
+# float32, int8 or pq
+DOCUMENT_CACHE_VECTOR_ENCODING = os.getenv("DOCUMENT_CACHE_VECTOR_ENCODING", "float32")
+RAG_RECALL_TARGET = os.getenv("RAG_RECALL_TARGET", "balanced")
+# Optional ONNX Runtime embedding backend (e.g. int8-quantized all-MiniLM-L6-v2), SentenceTransformer if not set
+RAG_ONNX_MODEL_DIR = os.getenv("RAG_ONNX_MODEL_DIR")
+RAG_ONNX_MODEL_FILE = os.getenv("RAG_ONNX_MODEL_FILE", "model.onnx")
+RAG_QUERY_CACHE_MAX_ENTRIES = int(os.getenv("RAG_QUERY_CACHE_MAX_ENTRIES", "10000"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "5"))
+RAG_FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000"))
+# Optional disk tier for RAG indexes, disabled if not set
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR")
+RAG_INDEX_MAX_DISK_BYTES = int(os.getenv("RAG_INDEX_MAX_DISK_BYTES", str(10 * 1024**3)))
 
 
 class GeneralPurposeAgentApplication(ChatCompletion):
     def __init__(self):
         self.tools: list[BaseTool] = []
+        # Shared by the agent and all tools, one connection pool per endpoint for the whole process
+        self.client_registry = DialClientRegistry(
+            max_connections=DIAL_MAX_CONNECTIONS,
+            max_keepalive_connections=DIAL_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=DIAL_KEEPALIVE_EXPIRY_SECONDS,
+            max_clients=DIAL_MAX_CLIENTS,
+            idle_ttl_seconds=DIAL_CLIENT_IDLE_TTL_SECONDS,
+            http2=DIAL_HTTP2,
+        )
+        register_collector(ConnectionPoolCollector(self.client_registry.stats))
+        self.text_cache = ExtractedTextCache(
+            max_size_chars=EXTRACTED_TEXT_CACHE_MAX_CHARS,
+            max_source_bytes=EXTRACTED_TEXT_CACHE_MAX_SOURCE_BYTES,
+        )
+        # Created once here: tool creation is retried while the MCP servers are not up yet
+        self.document_cache = DocumentCache.create(
+            max_memory_bytes=DOCUMENT_CACHE_MAX_BYTES,
+            ttl_seconds=DOCUMENT_CACHE_TTL_SECONDS,
+            eviction_policy=EvictionPolicy(DOCUMENT_CACHE_EVICTION_POLICY),
+            vector_encoding=VectorEncoding(DOCUMENT_CACHE_VECTOR_ENCODING),
+            disk_store=(
+                DiskDocumentStore(
+                    RAG_INDEX_DIR, max_disk_bytes=RAG_INDEX_MAX_DISK_BYTES
+                )
+                if RAG_INDEX_DIR
+                else None
+            ),
+        )
+        register_collector(
+            StatsCollector(
+                "agent_document_cache",
+                self.document_cache.stats,
+                counters={"hits", "misses", "disk_hits", "evictions", "expirations"},
+            )
+        )
+        self.query_cache = QueryEmbeddingCache(max_entries=RAG_QUERY_CACHE_MAX_ENTRIES)
+        register_collector(
+            StatsCollector(
+                "agent_query_embedding_cache",
+                self.query_cache.stats,
+                counters={"hits", "misses"},
+            )
+        )
+        self._local_tools: list[BaseTool] = []
+        self._tools_lock = asyncio.Lock()
+
+    async def _get_tools(self) -> list[BaseTool]:
+        async with self._tools_lock:
+            if not self.tools:
+                with startup_phase("create tools"):
+                    self.tools = await self._create_tools()
+        return self.tools
+
+    async def warm_up(self) -> None:
+        """Create the tools and load their heavy dependencies, so the first request doesn't pay for it."""
+        try:
+            tools = await self._get_tools()
+            await asyncio.gather(*(tool.warm_up() for tool in tools))
+        except Exception as e:
+            logger.error("warm_up_failed", error=str(e))
+
+        logger.info("startup_report", phases_ms=startup_timings())
 
     async def _get_mcp_tools(self, url: str) -> list[BaseTool]:
         tools: list[BaseTool] = []
@@ -33,22 +159,16 @@ class GeneralPurposeAgentApplication(ChatCompletion):
         return tools
 
     async def _create_tools(self) -> list[BaseTool]:
-        tools: list[BaseTool] = []
-
-        tools.append(ImageGenerationTool(endpoint=DIAL_ENDPOINT))
-        tools.append(FileContentExtractionTool(endpoint=DIAL_ENDPOINT))
-        tools.append(
-            RagTool(
-                endpoint=DIAL_ENDPOINT,
-                deployment_name=DEPLOYMENT_NAME,
-                document_cache=DocumentCache.create(),
-            )
-        )
+        # Local tools don't depend on other services, only the MCP based ones are re-created on retry
+        if not self._local_tools:
+            self._local_tools = self._create_local_tools()
+        tools: list[BaseTool] = list(self._local_tools)
 
         interpreter_tool = await PythonCodeInterpreterTool.create(
             mcp_url="http://localhost:8050/mcp",
             tool_name="execute_code",
             dial_endpoint=DIAL_ENDPOINT,
+            client_registry=self.client_registry,
         )
         tools.append(interpreter_tool)
 
@@ -57,24 +177,103 @@ class GeneralPurposeAgentApplication(ChatCompletion):
 
         return tools
 
-    async def chat_completion(self, request: Request, response: Response) -> None:
-        if not self.tools:
-            self.tools = await self._create_tools()
+    def _create_local_tools(self) -> list[BaseTool]:
+        tools: list[BaseTool] = []
 
-        with response.create_single_choice() as choice:
-            agent = GeneralPurposeAgent(
-                endpoint=DIAL_ENDPOINT, system_prompt=SYSTEM_PROMPT, tools=self.tools
+        tools.append(
+            ImageGenerationTool(
+                endpoint=DIAL_ENDPOINT, client_registry=self.client_registry
             )
-            await agent.handle_request(
+        )
+        tools.append(
+            FileContentExtractionTool(
+                endpoint=DIAL_ENDPOINT,
+                text_cache=self.text_cache,
+                client_registry=self.client_registry,
+            )
+        )
+        tools.append(
+            RagTool(
+                endpoint=DIAL_ENDPOINT,
                 deployment_name=DEPLOYMENT_NAME,
-                choice=choice,
-                request=request,
-                response=response,
+                document_cache=self.document_cache,
+                text_cache=self.text_cache,
+                embedding_service=EmbeddingService(
+                    backend=(
+                        OnnxEmbeddingBackend(
+                            RAG_ONNX_MODEL_DIR, model_file=RAG_ONNX_MODEL_FILE
+                        )
+                        if RAG_ONNX_MODEL_DIR
+                        else SentenceTransformerBackend()
+                    ),
+                    query_cache=self.query_cache,
+                ),
+                client_registry=self.client_registry,
+                recall_target=RecallTarget(RAG_RECALL_TARGET),
+                top_k=RAG_TOP_K,
+                fetch_k=RAG_FETCH_K,
+                mmr_lambda=RAG_MMR_LAMBDA,
+                context_token_budget=RAG_CONTEXT_TOKEN_BUDGET,
             )
+        )
+
+        return tools
+
+    async def chat_completion(self, request: Request, response: Response) -> None:
+        with IN_FLIGHT_REQUESTS.track_inprogress():
+            # Spans of all requests of a conversation share its trace ID
+            conversation_id = request.headers.get("x-conversation-id")
+            with sample_request(conversation_id), tracer.start_trace(
+                "chat_completion",
+                trace_id=conversation_id,
+                deployment=DEPLOYMENT_NAME,
+            ):
+                tools = await self._get_tools()
+
+                with response.create_single_choice() as choice:
+                    agent = GeneralPurposeAgent(
+                        endpoint=DIAL_ENDPOINT,
+                        system_prompt=SYSTEM_PROMPT,
+                        tools=tools,
+                        client_registry=self.client_registry,
+                        max_iterations=AGENT_MAX_ITERATIONS,
+                        time_budget_seconds=AGENT_TIME_BUDGET_SECONDS,
+                    )
+                    await agent.handle_request(
+                        deployment_name=DEPLOYMENT_NAME,
+                        choice=choice,
+                        request=request,
+                        response=response,
+                    )
 
 
-dial_app = DIALApp()
+configure_logging(
+    level=LOG_LEVEL,
+    debug_sample_rate=LOG_DEBUG_SAMPLE_RATE,
+    max_field_chars=LOG_MAX_FIELD_CHARS,
+)
 general_purpose_agent_app = GeneralPurposeAgentApplication()
+
+
+@asynccontextmanager
+async def lifespan(_):
+    if TRACE_EXPORT_PATH:
+        tracer.set_exporter(JsonLinesSpanExporter(TRACE_EXPORT_PATH))
+    warm_up_task = (
+        asyncio.create_task(general_purpose_agent_app.warm_up())
+        if WARM_UP_ON_STARTUP
+        else None
+    )
+    yield
+    if warm_up_task:
+        warm_up_task.cancel()
+    await general_purpose_agent_app.client_registry.aclose()
+    await asyncio.to_thread(general_purpose_agent_app.document_cache.close)
+    tracer.shutdown()
+
+
+dial_app = DIALApp(lifespan=lifespan)
+add_metrics_route(dial_app)
 dial_app.add_chat_completion(
     deployment_name="general-purpose-agent", impl=general_purpose_agent_app
 )
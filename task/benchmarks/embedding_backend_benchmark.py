@@ -0,0 +1,126 @@
+"""
+Throughput, latency and output agreement benchmark of RAG embedding backends.
+
+Run from the `task` directory:
+    python -m benchmarks.embedding_backend_benchmark --onnx-dir /models/all-MiniLM-L6-v2/onnx
+    python -m benchmarks.embedding_backend_benchmark --onnx-dir /models/all-MiniLM-L6-v2/onnx --quantize --documents ../tests/microwave_manual.txt
+
+The first backend (SentenceTransformer unless --no-torch) is the reference: agreement is the cosine
+similarity between its embeddings and those of every other backend for the same chunks.
+`--quantize` writes a dynamically int8-quantized copy of `model.onnx` next to it and adds it.
+ONNX Runtime quantization also needs the `onnx` package, which is not a service requirement.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from benchmarks.rag_index_benchmark import split_document
+from tools.rag.embedding_backend import (
+    EmbeddingBackend,
+    OnnxEmbeddingBackend,
+    SentenceTransformerBackend,
+)
+
+_QUANTIZED_MODEL_FILE = "model_int8.onnx"
+
+
+def quantize_model(model_dir: Path) -> None:
+    """Dynamic int8 quantization of `model.onnx` weights."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        model_dir / "model.onnx",
+        model_dir / _QUANTIZED_MODEL_FILE,
+        weight_type=QuantType.QInt8,
+    )
+
+
+def synthetic_texts(count: int, seed: int = 0) -> list[str]:
+    """Chunk-sized texts of random manual-like words."""
+    words = (
+        "the microwave oven door turntable power level timer defrost press button start stop "
+        "minutes seconds cooking food plate glass error code display clean warning heat "
+        "program clock setting safety child lock grill model part replace check"
+    ).split()
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(words, rng.integers(40, 90))) for _ in range(count)]
+
+
+def measure(
+    backend: EmbeddingBackend, texts: list[str], batch_size: int, queries: int
+) -> tuple[np.ndarray, float, float, float]:
+    """Returns embeddings, throughput in texts/s, p50 and p99 single-query latency in ms."""
+    backend.encode(texts[:batch_size])  # warm-up
+
+    start = time.perf_counter()
+    embeddings = np.concatenate(
+        [backend.encode(texts[i : i + batch_size]) for i in range(0, len(texts), batch_size)]
+    )
+    throughput = len(texts) / (time.perf_counter() - start)
+
+    latencies = []
+    for text in texts[:queries]:
+        start = time.perf_counter()
+        backend.encode([text[:100]])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return embeddings, throughput, float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def cosine_agreement(reference: np.ndarray, embeddings: np.ndarray) -> tuple[float, float]:
+    """Mean and min cosine similarity between rows of the same texts."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    similarity = np.einsum("ij,ij->i", reference, embeddings)
+    return float(similarity.mean()), float(similarity.min())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--onnx-dir", type=Path)
+    parser.add_argument("--onnx-files", nargs="*", default=["model.onnx"])
+    parser.add_argument("--quantize", action="store_true")
+    parser.add_argument("--no-torch", action="store_true", help="Skip the SentenceTransformer backend")
+    parser.add_argument("--documents", type=Path, nargs="*", default=[])
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    backends: list[EmbeddingBackend] = []
+    if not args.no_torch:
+        backends.append(SentenceTransformerBackend())
+
+    if args.onnx_dir:
+        onnx_files = list(args.onnx_files)
+        if args.quantize:
+            quantize_model(args.onnx_dir)
+            onnx_files.append(_QUANTIZED_MODEL_FILE)
+        backends.extend(
+            OnnxEmbeddingBackend(args.onnx_dir, model_file=onnx_file) for onnx_file in onnx_files
+        )
+
+    if not backends:
+        parser.error("no backends to compare, pass --onnx-dir")
+
+    texts = [chunk for path in args.documents for chunk in split_document(path)]
+    texts = texts[: args.texts] or synthetic_texts(args.texts)
+
+    print(f"{len(texts)} texts, batch size {args.batch_size}")
+    print(f"{'backend':<36} {'texts/s':>9} {'p50, ms':>8} {'p99, ms':>8} {'cos mean':>9} {'cos min':>8}")
+
+    reference = None
+    for backend in backends:
+        embeddings, throughput, p50, p99 = measure(backend, texts, args.batch_size, args.queries)
+        if reference is None:
+            reference = embeddings
+        mean, minimum = cosine_agreement(reference, embeddings)
+        print(
+            f"{backend.model_name:<36} {throughput:>9.1f} {p50:>8.2f} {p99:>8.2f} {mean:>9.4f} {minimum:>8.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Memory and recall benchmark of quantized vector encodings (float32, int8, PQ) for RAG indexes.
+
+Run from the `task` directory:
+    python -m benchmarks.quantization_benchmark
+    python -m benchmarks.quantization_benchmark --sizes 20000 --documents ../tests/microwave_manual.txt
+
+Memory is the serialized FAISS index size per 1k chunks; for real documents the chunk strings are
+reported separately. Recall@k is measured against the float32 flat index on the same vectors.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+from benchmarks.rag_index_benchmark import (
+    document_embeddings,
+    make_queries,
+    measure_search,
+    recall_at_k,
+    split_document,
+    synthetic_embeddings,
+)
+from tools.rag.document_cache import estimate_size
+from tools.rag.index_factory import (
+    IndexType,
+    RecallTarget,
+    VectorEncoding,
+    build_index,
+)
+
+
+def memory_per_1k(size_bytes: int, count: int) -> float:
+    """KiB per 1000 chunks."""
+    return size_bytes / count * 1000 / 1024
+
+
+def benchmark(
+    name: str,
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    chunks: list[str] | None = None,
+) -> None:
+    count = len(embeddings)
+    k = min(k, count)
+    ground_truth, _, _ = measure_search(
+        build_index(embeddings, index_type=IndexType.FLAT), queries, k
+    )
+
+    print(f"\n## {name}: {count} chunks")
+    if chunks is not None:
+        print(f"chunk strings: {memory_per_1k(estimate_size(chunks), count):.1f} KiB per 1k chunks")
+
+    print(f"{'index':<8} {'encoding':<9} {'build, s':>9} {'KiB/1k':>9} {'p50, ms':>8} {'recall@' + str(k):>10}")
+    for index_type in IndexType:
+        for vector_encoding in VectorEncoding:
+            try:
+                start = time.perf_counter()
+                index = build_index(
+                    embeddings,
+                    RecallTarget.BALANCED,
+                    index_type=index_type,
+                    vector_encoding=vector_encoding,
+                )
+                build_time = time.perf_counter() - start
+            except ValueError as e:
+                # IVF-PQ can't be trained on too few vectors
+                print(f"{index_type.value:<8} {'-':<9} n/a: {e}")
+                break
+
+            size = faiss.serialize_index(index).nbytes
+            found, p50, _ = measure_search(index, queries, k)
+            recall = recall_at_k(found, ground_truth)
+            encoding = "pq" if index_type == IndexType.IVF_PQ else vector_encoding.value
+            print(
+                f"{index_type.value:<8} {encoding:<9} {build_time:>9.2f} {memory_per_1k(size, count):>9.1f} {p50:>8.3f} {recall:>10.3f}"
+            )
+
+            # IVF-PQ always stores PQ codes
+            if index_type == IndexType.IVF_PQ:
+                break
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1_000, 20_000])
+    parser.add_argument("--documents", type=Path, nargs="*", default=[])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        embeddings = synthetic_embeddings(size)
+        benchmark("synthetic", embeddings, make_queries(embeddings, args.queries), args.k)
+
+    for path in args.documents:
+        chunks = split_document(path)
+        embeddings = document_embeddings(path, chunks)
+        benchmark(path.name, embeddings, make_queries(embeddings, args.queries), args.k, chunks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Recall and latency benchmark of RAG index types (flat, HNSW, IVF-PQ).
+
+Run from the `task` directory:
+    python -m benchmarks.rag_index_benchmark
+    python -m benchmarks.rag_index_benchmark --sizes 10000 100000 --documents ../tests/microwave_manual.txt
+
+Flat (brute force) search is the ground truth for recall@k. Synthetic embeddings are clustered
+gaussian vectors; real documents are split and embedded the same way as in `RagTool`.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+from tools.rag.index_factory import (
+    IndexType,
+    RecallTarget,
+    build_index,
+    select_index_type,
+)
+
+_DIMENSION = 384
+
+
+def synthetic_embeddings(
+    count: int, dimension: int = _DIMENSION, clusters: int = 100, seed: int = 0
+) -> np.ndarray:
+    """Clustered, L2-normalized vectors, closer to sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, count)]
+    vectors += 0.5 * rng.standard_normal((count, dimension)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def split_document(path: Path) -> list[str]:
+    """Split the document with the `RagTool` splitter config."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=500,
+        chunk_overlap=50,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+    return text_splitter.split_text(path.read_text(encoding="utf-8", errors="ignore"))
+
+
+def document_embeddings(path: Path, chunks: list[str] | None = None) -> np.ndarray:
+    """Split and embed the document with the `RagTool` splitter config and model."""
+    from sentence_transformers import SentenceTransformer
+
+    chunks = chunks if chunks is not None else split_document(path)
+    transformer = SentenceTransformer(model_name_or_path="all-MiniLM-L6-v2")
+    return np.asarray(transformer.encode(chunks), dtype="float32")
+
+
+def make_queries(embeddings: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    """Perturbed copies of random stored vectors."""
+    rng = np.random.default_rng(seed)
+    queries = embeddings[rng.integers(0, len(embeddings), count)].copy()
+    queries += 0.1 * rng.standard_normal(queries.shape).astype("float32")
+    return queries
+
+
+def recall_at_k(found: np.ndarray, ground_truth: np.ndarray) -> float:
+    """Share of true top-k neighbours found by the tested index."""
+    hits = sum(
+        len(set(row[row >= 0]) & set(truth)) for row, truth in zip(found, ground_truth)
+    )
+    return hits / ground_truth.size
+
+
+def measure_search(
+    index: faiss.Index, queries: np.ndarray, k: int
+) -> tuple[np.ndarray, float, float]:
+    """Search one query at a time, as `RagTool` does. Returns indices, p50 and p99 latency in ms."""
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, indices = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(indices[0])
+    return np.array(results), float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def benchmark(name: str, embeddings: np.ndarray, queries: np.ndarray, k: int) -> None:
+    count = len(embeddings)
+    k = min(k, count)
+    ground_truth, _, _ = measure_search(
+        build_index(embeddings, index_type=IndexType.FLAT), queries, k
+    )
+
+    print(f"\n## {name}: {count} chunks")
+    for recall_target in RecallTarget:
+        print(f"auto-selected for {recall_target.value}: {select_index_type(count, recall_target).value}")
+
+    print(f"{'index':<8} {'target':<9} {'build, s':>9} {'p50, ms':>8} {'p99, ms':>8} {'recall@' + str(k):>10}")
+    for index_type in IndexType:
+        for recall_target in RecallTarget:
+            try:
+                start = time.perf_counter()
+                index = build_index(embeddings, recall_target, index_type=index_type)
+                build_time = time.perf_counter() - start
+            except ValueError as e:
+                # IVF-PQ can't be trained on too few vectors
+                print(f"{index_type.value:<8} {recall_target.value:<9} n/a: {e}")
+                break
+
+            found, p50, p99 = measure_search(index, queries, k)
+            recall = recall_at_k(found, ground_truth)
+            print(
+                f"{index_type.value:<8} {recall_target.value:<9} {build_time:>9.2f} {p50:>8.3f} {p99:>8.3f} {recall:>10.3f}"
+            )
+
+            if index_type == IndexType.FLAT:
+                break
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--documents", type=Path, nargs="*", default=[])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        embeddings = synthetic_embeddings(size)
+        benchmark("synthetic", embeddings, make_queries(embeddings, args.queries), args.k)
+
+    for path in args.documents:
+        embeddings = document_embeddings(path)
+        benchmark(path.name, embeddings, make_queries(embeddings, args.queries), args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Import-time and startup breakdown of the agent app.
+
+Run from the `task` directory:
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --top 30 --no-heavy
+
+First, `import app` runs in a fresh interpreter with `-X importtime`, and the self time of every
+imported module is summed per top-level package. Then the lazily imported heavy dependencies are
+imported one by one, as the startup warm-up does, and their cost is reported with the startup
+breakdown of `utils.startup`.
+"""
+
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from utils.startup import import_module, startup_phase, startup_report
+
+HEAVY_MODULES = [
+    "faiss",
+    "pandas",
+    "tabulate",
+    "pdfplumber",
+    "bs4",
+    "langchain_text_splitters",
+    "sentence_transformers",
+]
+
+
+def app_import_times() -> tuple[float, dict[str, float]]:
+    """Returns total `import app` time and self time per top-level package, in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    packages: dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        self_time, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not self_time.isdigit():
+            continue  # header
+
+        packages[name.split(".")[0]] += int(self_time) / 1000
+        if name == "app":
+            total = int(cumulative) / 1000
+
+    return total, packages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--no-heavy", action="store_true", help="Skip importing the lazy heavy dependencies")
+    args = parser.parse_args()
+
+    total, packages = app_import_times()
+    print(f"## import app: {total:.1f} ms")
+    for name, milliseconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[: args.top]:
+        print(f"  {milliseconds:10.1f} ms  {name}")
+
+    with startup_phase("import app"):
+        import app  # noqa: F401
+
+    heavy_loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    if heavy_loaded:
+        print(f"\nWARNING: imported eagerly by app: {', '.join(heavy_loaded)}")
+
+    if not args.no_heavy:
+        for name in HEAVY_MODULES:
+            try:
+                import_module(name)
+            except ImportError as e:
+                print(f"{name}: not installed ({e})")
+
+    print()
+    print(startup_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
 from typing import Any
 
@@ -5,6 +7,7 @@ from aidial_client.types.chat import FunctionParam, ToolParam
 from aidial_client.types.chat.legacy.chat_completion import Role
 from aidial_sdk.chat_completion import Message
 from tools.models import ToolCallParams
+from utils.metrics import observe_tool_call
 
 
 class BaseTool(ABC):
@@ -15,6 +18,9 @@ class BaseTool(ABC):
             tool_call_id=tool_call_params.tool_call.id,
         )
 
+        start = time.perf_counter()
+        status = "success"
+
         try:
             result = await self._execute(tool_call_params)
 
@@ -22,15 +28,26 @@ class BaseTool(ABC):
                 message = result
             else:
                 message.content = result
+        except asyncio.CancelledError:
+            # Propagated, so the caller sees the call as cancelled, e.g. when the time budget ran out
+            status = "cancelled"
+            raise
         except Exception as e:
+            status = "error"
             message.content = f"Error occurred while tool execution: {e}"
         finally:
-            return message
+            observe_tool_call(self.name, time.perf_counter() - start, status)
+
+        return message
 
     @abstractmethod
     async def _execute(self, tool_call_params: ToolCallParams) -> str | Message:
         pass
 
+    async def warm_up(self) -> None:
+        """Load heavy dependencies ahead of the first call. Called in background at app startup."""
+        pass
+
     @property
     def show_in_stage(self) -> bool:
         return True
@@ -2,16 +2,18 @@ import json
 from abc import ABC, abstractmethod
 from typing import Any, AsyncIterable
 
-from aidial_client import AsyncDial
 from aidial_client.types.chat import ChatCompletionChunk
 from aidial_sdk.chat_completion import CustomContent, Message, Role
 from tools.base import BaseTool
 from tools.models import ToolCallParams
+from utils.dial_client_registry import DialClientRegistry
+from utils.metrics import observe_llm_stream
 
 
 class DeploymentTool(BaseTool, ABC):
-    def __init__(self, endpoint: str):
+    def __init__(self, endpoint: str, client_registry: DialClientRegistry):
         self.endpoint = endpoint
+        self.client_registry = client_registry
 
     @property
     @abstractmethod
@@ -26,20 +28,21 @@ class DeploymentTool(BaseTool, ABC):
         args: dict = json.loads(tool_call_params.tool_call.function.arguments)
         promt = args.pop("prompt")
 
-        dial_client = AsyncDial(
-            base_url=self.endpoint,
-            api_version="2025-01-01-preview",
+        dial_client = self.client_registry.get_async_client(
+            endpoint=self.endpoint,
             api_key=tool_call_params.api_key,
+            api_version="2025-01-01-preview",
         )
 
-        stream: AsyncIterable[
-            ChatCompletionChunk
-        ] = await dial_client.chat.completions.create(
-            messages=[{"role": Role.USER, "content": promt}],
-            deployment_name=self.deployment_name,
-            stream=True,
-            extra_body={"custom_fields": {"configuration": {**args}}},
-            **self.tool_parameters,
+        stream: AsyncIterable[ChatCompletionChunk] = observe_llm_stream(
+            self.deployment_name,
+            dial_client.chat.completions.create(
+                messages=[{"role": Role.USER, "content": promt}],
+                deployment_name=self.deployment_name,
+                stream=True,
+                extra_body={"custom_fields": {"configuration": {**args}}},
+                **self.tool_parameters,
+            ),
         )
 
         content = ""
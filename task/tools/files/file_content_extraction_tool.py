@@ -1,10 +1,14 @@
+import asyncio
 import json
 from typing import Any
 
 from aidial_sdk.chat_completion import Message
 from tools.base import BaseTool
 from tools.models import ToolCallParams
+from utils import dial_file_conent_extractor
+from utils.dial_client_registry import DialClientRegistry
 from utils.dial_file_conent_extractor import DialFileContentExtractor
+from utils.extracted_text_cache import ExtractedTextCache
 
 
 class FileContentExtractionTool(BaseTool):
@@ -14,13 +18,23 @@ class FileContentExtractionTool(BaseTool):
     USAGE: Start with page=1 (by default)
     """
 
-    def __init__(self, endpoint: str):
+    def __init__(
+        self,
+        endpoint: str,
+        text_cache: ExtractedTextCache,
+        client_registry: DialClientRegistry,
+    ):
         self.endpoint = endpoint
+        self.text_cache = text_cache
+        self.client_registry = client_registry
 
     @property
     def show_in_stage(self) -> bool:
         return False
 
+    async def warm_up(self) -> None:
+        await asyncio.to_thread(dial_file_conent_extractor.warm_up)
+
     @property
     def name(self) -> str:
         return "file_content_extraction_tool"
@@ -29,7 +43,8 @@ class FileContentExtractionTool(BaseTool):
     def description(self) -> str:
         return """
             Extracts text content from files. Supported: PDF (text only), TXT, CSV (as markdown table), HTML/HTM.
-            PAGINATION: Files >10,000 chars are paginated. Response format: `**Page #X. Total pages: Y**` appears at end if paginated.
+            PAGINATION: Files >10,000 chars are paginated, CSV pages are tables of the rows that fit into 10,000 chars. Response format: `**Page #X. Total pages: Y**` appears at end if paginated.
+            For PDFs that are not fully read yet, Y is an estimation prefixed with `~`.
             USAGE: Start with page=1 (by default)
             """
 
@@ -67,29 +82,27 @@ class FileContentExtractionTool(BaseTool):
 
         stage.append_content("## Response: \n")
 
-        content = DialFileContentExtractor(
-            self.endpoint, tool_call_params.api_key
-        ).extract_text(file_url)
+        page_size = 10000
 
-        if not content:
-            content = "Error: File content not found."
+        # Files are read lazily, so only the part of the file up to the requested page is parsed
+        text_page = await DialFileContentExtractor(
+            self.endpoint, tool_call_params.api_key, self.text_cache, self.client_registry
+        ).extract_page(file_url, page, page_size)
 
-        if len(content) > 10000:
-            page_size = 10000
-            total_pages = (len(content) + page_size - 1) // page_size
+        content = text_page.text
+        total_pages = (
+            str(text_page.page_count)
+            if text_page.is_exact
+            else f"~{text_page.page_count}"
+        )
 
-            if page > total_pages:
-                content = (
-                    f"Error: Page {page} does not exist. Total pages: {total_pages}"
-                )
+        if not text_page.page_count:
+            content = "Error: File content not found."
+        elif text_page.page_count > 1:
+            if not content:
+                content = f"Error: Page {page} does not exist. Total pages: {total_pages}"
             else:
-                start_index = (page - 1) * page_size
-                end_index = start_index + page_size
-
-                page_content = content[start_index:end_index]
-                content = (
-                    f"{page_content}\n\n**Page #{page}. Total pages: {total_pages}**"
-                )
+                content = f"{content}\n\n**Page #{page}. Total pages: {total_pages}**"
 
         stage.append_content(f"```text\n\r{content}\n\r```\n\r")
 
@@ -11,6 +11,10 @@ from mcp.types import (
 )
 from pydantic import AnyUrl
 from tools.mcp.mcp_tool_model import MCPToolModel
+from utils.structured_logging import get_logger
+from utils.tracing import tracer
+
+logger = get_logger("mcp_client")
 
 
 class MCPClient:
@@ -41,7 +45,14 @@ class MCPClient:
         self.session: ClientSession = await self._session_context.__aenter__()
 
         init_result = await self.session.initialize()
-        print(init_result.model_dump_json(indent=2))
+        logger.info(
+            "mcp_connected",
+            server=self.server_url,
+            server_info=lambda: init_result.serverInfo.model_dump(mode="json"),
+        )
+        logger.debug(
+            "mcp_initialize_result", result=lambda: init_result.model_dump(mode="json")
+        )
 
     async def get_tools(self) -> list[MCPToolModel]:
         """Get available tools from MCP server"""
@@ -68,9 +79,10 @@ class MCPClient:
         if not self.session:
             raise RuntimeError("MCP client not connected.")
 
-        print(f"    Calling `{tool_name}` with {tool_args}")
+        logger.debug("mcp_call_tool", tool=tool_name, arguments=tool_args)
 
-        tool_result: CallToolResult = await self.session.call_tool(tool_name, tool_args)
+        with tracer.span("mcp.call_tool", tool=tool_name, server=self.server_url):
+            tool_result: CallToolResult = await self.session.call_tool(tool_name, tool_args)
 
         if not tool_result.content:
             return None
@@ -87,7 +99,8 @@ class MCPClient:
         if not self.session:
             raise RuntimeError("MCP client not connected.")
 
-        resource: ReadResourceResult = await self.session.read_resource(uri)
+        with tracer.span("mcp.get_resource", uri=str(uri), server=self.server_url):
+            resource: ReadResourceResult = await self.session.read_resource(uri)
 
         if not resource.contents:
             raise RuntimeError(f"Resource {uri} not found")
@@ -1,12 +1,13 @@
 from dataclasses import dataclass
 
-from aidial_sdk.chat_completion import Choice, Stage, ToolCall
+from aidial_sdk.chat_completion import ToolCall
+from utils.stage import BufferedChoice, BufferedStage
 
 
 @dataclass
 class ToolCallParams:
     tool_call: ToolCall
-    stage: Stage
-    choice: Choice
+    stage: BufferedStage
+    choice: BufferedChoice
     api_key: str
     conversation_id: str
@@ -2,7 +2,6 @@ import base64
 import json
 from typing import Any, Optional
 
-from aidial_client import Dial
 from aidial_sdk.chat_completion import Attachment, Message
 from pydantic import AnyUrl
 from tools.base import BaseTool
@@ -10,6 +9,10 @@ from tools.mcp.mcp_client import MCPClient
 from tools.mcp.mcp_tool_model import MCPToolModel
 from tools.models import ToolCallParams
 from tools.py_interpreter._response import _ExecutionResult
+from utils.dial_client_registry import DialClientRegistry
+from utils.structured_logging import get_logger
+
+logger = get_logger("python_code_interpreter")
 
 
 class PythonCodeInterpreterTool(BaseTool):
@@ -25,12 +28,14 @@ class PythonCodeInterpreterTool(BaseTool):
         mcp_tool_models: list[MCPToolModel],
         tool_name: str,
         dial_endpoint: str,
+        client_registry: DialClientRegistry,
     ):
         """
         :param tool_name: it must be actual name of tool that executes code. It is 'execute_code'.
             https://github.com/khshanovskyi/mcp-python-code-interpreter/blob/main/interpreter/server.py#L303
         """
         self.dial_endpoint = dial_endpoint
+        self.client_registry = client_registry
         self.mcp_client = mcp_client
         self._code_execute_tool: Optional[MCPToolModel] = None
 
@@ -48,6 +53,7 @@ class PythonCodeInterpreterTool(BaseTool):
         mcp_url: str,
         tool_name: str,
         dial_endpoint: str,
+        client_registry: DialClientRegistry,
     ) -> "PythonCodeInterpreterTool":
         """Async factory method to create PythonCodeInterpreterTool"""
         client = MCPClient(mcp_url)
@@ -60,6 +66,7 @@ class PythonCodeInterpreterTool(BaseTool):
             mcp_tool_models=tools,
             tool_name=tool_name,
             dial_endpoint=dial_endpoint,
+            client_registry=client_registry,
         )
 
     @property
@@ -99,12 +106,12 @@ class PythonCodeInterpreterTool(BaseTool):
         )
 
         if execution_result.files:
-            dial_client = Dial(
-                base_url=self.dial_endpoint,
+            dial_client = self.client_registry.get_async_client(
+                endpoint=self.dial_endpoint,
                 api_key=tool_call_params.api_key,
             )
 
-            files_home = dial_client.my_appdata_home()
+            files_home = await dial_client.my_appdata_home()
 
             for file in execution_result.files:
                 name = file.name
@@ -121,9 +128,9 @@ class PythonCodeInterpreterTool(BaseTool):
                     file_data = base64.b64decode(resource)
 
                 url = f"files/{(files_home / name).as_posix()}"
-                print(url)
+                logger.debug("interpreter_file_upload", url=url, mime_type=mime_type)
 
-                dial_client.files.upload(url=url, file=file_data)
+                await dial_client.files.upload(url=url, file=file_data)
 
                 attachment = Attachment(url=url, type=mime_type, title=name)
                 stage.add_attachment(attachment)
@@ -0,0 +1,285 @@
+import dbm
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Tuple
+
+import numpy as np
+from tools.rag.hybrid_search import KeywordIndex
+from utils.startup import lazy_import
+from utils.structured_logging import get_logger
+
+faiss = lazy_import("faiss")
+
+logger = get_logger("disk_document_store")
+
+_CHUNKS_MAGIC = b"RAGCHNK1"
+
+
+class MappedChunks(Sequence):
+    """
+    Read-only sequence of chunk strings backed by a memory-mapped chunks file.
+    Chunks are decoded on access, so loading a document doesn't read the whole file.
+
+    File layout: magic, uint64 chunk count, uint64 offsets (count + 1), UTF-8 data.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(_CHUNKS_MAGIC)] != _CHUNKS_MAGIC:
+            raise ValueError(f"{path} is not a chunks file")
+
+        (count,) = struct.unpack_from("<Q", self._mmap, len(_CHUNKS_MAGIC))
+        offsets_start = len(_CHUNKS_MAGIC) + 8
+        self._offsets = np.frombuffer(
+            self._mmap, dtype="<u8", count=count + 1, offset=offsets_start
+        )
+        self._data_start = offsets_start + (count + 1) * 8
+
+    @property
+    def nbytes(self) -> int:
+        # Chunk data lives in the page cache, only the offsets are touched on every access
+        return int(self._offsets.nbytes)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("chunk index out of range")
+
+        start = self._data_start + int(self._offsets[position])
+        end = self._data_start + int(self._offsets[position + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+
+def write_chunks(path: Path, chunks: Sequence[str]) -> None:
+    """Write chunks in the `MappedChunks` file layout."""
+    encoded = [chunk.encode("utf-8") for chunk in chunks]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+
+    with open(path, "wb") as file:
+        file.write(_CHUNKS_MAGIC)
+        file.write(struct.pack("<Q", len(encoded)))
+        file.write(offsets.tobytes())
+        for chunk in encoded:
+            file.write(chunk)
+
+
+class DiskDocumentStore:
+    """
+    Persistent disk tier for indexed documents.
+
+    FAISS indexes are stored with `faiss.write_index`, chunks in a compact offsets + UTF-8 file and
+    BM25 keyword indexes as `.npz` arrays, all named by the document content key. Cache keys are
+    mapped to content keys in a dbm file, so a document is found again after restart without
+    re-extracting the file. Documents are loaded with memory-mapped reads, so they are available
+    within milliseconds and the OS page cache decides what stays resident. When the documents exceed
+    `max_disk_bytes`, least recently loaded or saved documents are deleted together with the key
+    mappings pointing to them. Document sizes and the use order are tracked in memory; the directory
+    is scanned only on start, ordered by the last use of the previous run. Call `close` on shutdown
+    to write the key mappings.
+    """
+
+    def __init__(self, directory: str | Path, max_disk_bytes: int = 10 * 1024**3):
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._keys = dbm.open(str(self._directory / "keys"), "c")
+        # Stored documents in least recently used order, with their size on disk
+        self._documents: OrderedDict[str, int] = self.__scan_documents()
+        self._disk_bytes = sum(self._documents.values())
+        # Cache keys pointing to every content key, unlinked when the document is deleted
+        self._links: dict[str, set[str]] = self.__load_links()
+        # Single writer keeps saves off the caller thread and ordered
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DiskDocumentStore")
+
+    def save(
+        self,
+        content_key: str,
+        index: Any,
+        chunks: Sequence[str],
+        keyword_index: KeywordIndex | None = None,
+    ) -> None:
+        """Persist the document in background."""
+        self._writer.submit(self.__save, content_key, index, list(chunks), keyword_index)
+
+    def link(self, key: str, content_key: str) -> None:
+        """Map the cache key to the content key."""
+        with self._lock:
+            previous = self._keys.get(key)
+            if previous is not None:
+                self.__unlink(previous.decode("utf-8"), key)
+
+            self._keys[key] = content_key
+            self._links.setdefault(content_key, set()).add(key)
+
+    def resolve(self, key: str) -> str | None:
+        """Return the content key the cache key points to, if any."""
+        with self._lock:
+            content_key = self._keys.get(key)
+        return content_key.decode("utf-8") if content_key else None
+
+    def load(self, content_key: str) -> Tuple[Any, Any, KeywordIndex | None, int] | None:
+        """
+        Load the document with memory-mapped reads.
+
+        Returns:
+            Tuple of (index, chunks, keyword index, size on disk in bytes) if the document is stored,
+            None otherwise. Keyword index is None for documents stored without one.
+        """
+        index_path, chunks_path, keyword_index_path = self.__paths(content_key)
+        if not index_path.exists() or not chunks_path.exists():
+            return None
+
+        try:
+            try:
+                index = faiss.read_index(
+                    str(index_path), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+                )
+            except RuntimeError:
+                # Not every index type supports memory mapping
+                index = faiss.read_index(str(index_path))
+
+            chunks = MappedChunks(chunks_path)
+            keyword_index = (
+                KeywordIndex.load(keyword_index_path)
+                if keyword_index_path.exists()
+                else None
+            )
+        except Exception as e:
+            logger.warning("disk_document_load_failed", content_key=content_key, error=str(e))
+            return None
+
+        with self._lock:
+            if content_key in self._documents:
+                self._documents.move_to_end(content_key)
+
+        try:
+            # Modification time keeps the use order for the next start
+            os.utime(index_path)
+            size = index_path.stat().st_size + chunks_path.stat().st_size
+        except OSError:
+            size = 0
+
+        if keyword_index:
+            size += keyword_index.nbytes
+
+        return (index, chunks, keyword_index, size)
+
+    def close(self) -> None:
+        """Wait for pending saves and write the key mappings. Called on app shutdown."""
+        self._writer.shutdown(wait=True)
+        with self._lock:
+            self._keys.close()
+
+    def __paths(self, content_key: str) -> Tuple[Path, Path, Path]:
+        return (
+            self._directory / f"{content_key}.faiss",
+            self._directory / f"{content_key}.chunks",
+            self._directory / f"{content_key}.bm25.npz",
+        )
+
+    def __save(
+        self,
+        content_key: str,
+        index: Any,
+        chunks: list[str],
+        keyword_index: KeywordIndex | None,
+    ) -> None:
+        index_path, chunks_path, keyword_index_path = self.__paths(content_key)
+        if index_path.exists():
+            os.utime(index_path)
+            with self._lock:
+                if content_key in self._documents:
+                    self._documents.move_to_end(content_key)
+            return
+
+        try:
+            # Written under temporary names, so a crash never leaves a half-written document
+            tmp_index_path = index_path.with_suffix(".faiss.tmp")
+            tmp_chunks_path = chunks_path.with_suffix(".chunks.tmp")
+            write_chunks(tmp_chunks_path, chunks)
+            faiss.write_index(index, str(tmp_index_path))
+            os.replace(tmp_chunks_path, chunks_path)
+            if keyword_index:
+                tmp_keyword_index_path = self._directory / f"{content_key}.bm25.tmp"
+                keyword_index.save(tmp_keyword_index_path)
+                os.replace(tmp_keyword_index_path, keyword_index_path)
+            # Index file goes last: its presence marks the document as complete
+            os.replace(tmp_index_path, index_path)
+        except Exception as e:
+            logger.warning("disk_document_save_failed", content_key=content_key, error=str(e))
+            return
+
+        size = self.__size_on_disk(content_key)
+        with self._lock:
+            self._documents[content_key] = size
+            self._disk_bytes += size
+            self.__enforce_quota()
+            # Mappings of the saved document are written along with it, not only on close
+            self._keys.sync()
+
+    def __enforce_quota(self) -> None:
+        evicted = []
+        while self._disk_bytes > self._max_disk_bytes and self._documents:
+            content_key, size = self._documents.popitem(last=False)
+            self._disk_bytes -= size
+            for key in self._links.pop(content_key, ()):
+                del self._keys[key]
+            evicted.append(content_key)
+
+        # Memory-mapped readers keep working: unlinked files live until they are unmapped
+        for content_key in evicted:
+            for path in self.__paths(content_key):
+                path.unlink(missing_ok=True)
+
+    def __unlink(self, content_key: str, key: str) -> None:
+        keys = self._links.get(content_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._links[content_key]
+
+    def __size_on_disk(self, content_key: str) -> int:
+        return sum(
+            path.stat().st_size for path in self.__paths(content_key) if path.exists()
+        )
+
+    def __scan_documents(self) -> OrderedDict[str, int]:
+        documents = []
+        for index_path in self._directory.glob("*.faiss"):
+            try:
+                last_used = index_path.stat().st_mtime
+                documents.append((last_used, index_path.stem, self.__size_on_disk(index_path.stem)))
+            except OSError:
+                continue
+
+        return OrderedDict(
+            (content_key, size) for _, content_key, size in sorted(documents)
+        )
+
+    def __load_links(self) -> dict[str, set[str]]:
+        links: dict[str, set[str]] = {}
+        for raw_key in list(self._keys.keys()):
+            content_key = self._keys[raw_key].decode("utf-8")
+            if content_key in self._documents:
+                links.setdefault(content_key, set()).add(raw_key.decode("utf-8"))
+            else:
+                # Left by a document deleted before mappings were removed with it
+                del self._keys[raw_key]
+        return links
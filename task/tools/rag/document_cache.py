@@ -1,101 +1,383 @@
-from datetime import datetime, time, timedelta
-from typing import Any, Tuple
+import sys
 import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Optional, Tuple
+
+from tools.rag.disk_document_store import DiskDocumentStore
+from tools.rag.index_factory import VectorEncoding
+from utils.structured_logging import get_logger
+
+logger = get_logger("document_cache")
+
+
+class EvictionPolicy(str, Enum):
+    LRU = "lru"
+    LFU = "lfu"
+
+
+@dataclass
+class _CachedDocument:
+    index: Any
+    chunks: Any
+    keyword_index: Any
+    size_bytes: int
+    keys: set[str] = field(default_factory=set)
+    last_access: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint in bytes of a FAISS index, numpy array, string or list of them."""
+    if value is None:
+        return 0
+
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+
+    if type(value).__module__.startswith("faiss"):
+        return _faiss_index_size(value)
+
+    return sys.getsizeof(value)
+
+
+def _faiss_index_size(index: Any) -> int:
+    """Bytes of the vector codes, ids, graph links and codebooks of the index, without serializing it."""
+    import faiss
+
+    index = faiss.downcast_index(index)
+
+    if isinstance(index, faiss.IndexHNSW):
+        hnsw = index.hnsw
+        return (
+            _faiss_index_size(index.storage)
+            + 4 * hnsw.neighbors.size()
+            + 4 * hnsw.levels.size()
+            + 8 * hnsw.offsets.size()
+        )
+
+    if isinstance(index, faiss.IndexIVF):
+        # Codes and ids in the inverted lists, plus the coarse quantizer centroids
+        size = index.ntotal * (index.code_size + 8) + _faiss_index_size(index.quantizer)
+        if index.direct_map.type != faiss.DirectMap.NoMap:
+            size += 8 * index.ntotal
+    else:
+        size = index.ntotal * getattr(index, "code_size", 4 * index.d)
+
+    pq = getattr(index, "pq", None)
+    if pq is not None:
+        size += 4 * pq.centroids.size()
+
+    return int(size)
 
 
 class DocumentCache:
     """
-    Thread-safe document cache with automatic cleanup at midnight.
-    Removes entries older than 24 hours.
+    Thread-safe, memory-bounded document cache with sliding TTL.
+
+    Indexed documents are stored once per content key (hash of the document content and indexing
+    config), and cache keys (e.g. per conversation) point to them. A document is kept while at least
+    one cache key references it, so the same file opened in many conversations is indexed once.
+
+    Every document is measured in bytes (FAISS index, chunks and keyword index). When the total size exceeds
+    `max_memory_bytes`, documents are evicted by the eviction policy (least recently or least
+    frequently used). A document bigger than `max_memory_bytes` alone is not kept in memory at all,
+    only in the disk tier if there is one. A cache key expires when it was not accessed for
+    `ttl_seconds`; expired keys are dropped on access and by a periodic background sweep.
+
+    With `disk_store`, documents and key mappings are also persisted to disk. A memory miss falls
+    back to the disk tier, so documents evicted from memory or indexed before a restart are loaded
+    back with memory-mapped reads instead of being indexed again.
+
+    `vector_encoding` selects how documents of this cache store their vectors: quantized encodings
+    shrink the FAISS index 4x (int8) or more (PQ) at a small recall cost.
     """
 
-    def __init__(self):
-        self._cache: dict[str, Tuple[Any, Any, datetime]] = {}
+    def __init__(
+        self,
+        max_memory_bytes: int = 2 * 1024**3,
+        ttl_seconds: float = 24 * 60 * 60,
+        eviction_policy: EvictionPolicy = EvictionPolicy.LRU,
+        sweep_interval_seconds: float = 5 * 60,
+        disk_store: Optional[DiskDocumentStore] = None,
+        vector_encoding: VectorEncoding = VectorEncoding.FLOAT32,
+    ):
+        self.vector_encoding = vector_encoding
+        self._documents: dict[str, _CachedDocument] = {}
+        self._cache: dict[str, Tuple[str, float]] = {}
         self._lock = threading.Lock()
+        self._max_memory_bytes = max_memory_bytes
+        self._ttl_seconds = ttl_seconds
+        self._eviction_policy = eviction_policy
+        self._sweep_interval_seconds = sweep_interval_seconds
+        self._memory_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._disk_hits = 0
+        self._disk_store = disk_store
         self._cleanup_thread = None
         self._stop_event = threading.Event()
         self._running = False
 
     @classmethod
-    def create(cls) ->'DocumentCache':
-        instance = cls()
+    def create(cls, **kwargs) -> 'DocumentCache':
+        instance = cls(**kwargs)
         instance.start_cleanup_task()
         return instance
 
-    def get(self, key: str) -> Tuple[Any, Any] | None:
+    def get(self, key: str) -> Tuple[Any, Any, Any] | None:
         """
-        Retrieve a cached entry.
+        Retrieve a cached entry and refresh its TTL.
 
         Args:
             key: Cache key
 
         Returns:
-            Tuple of (index, chunks) if found and not expired, None otherwise
+            Tuple of (index, chunks, keyword index) if found and not expired, None otherwise
         """
         with self._lock:
+            now = time.monotonic()
+
             if key in self._cache:
-                index, chunks, timestamp = self._cache[key]
-                if datetime.now() - timestamp < timedelta(hours=24):
-                    return (index, chunks)
+                content_key, last_access = self._cache[key]
+                if now - last_access < self._ttl_seconds:
+                    self._cache[key] = (content_key, now)
+                    self._hits += 1
+                    return self._touch(content_key, now)
                 else:
-                    del self._cache[key]
+                    self._remove_key(key)
+                    self._expirations += 1
+                    return self._miss()
+
+        if self._disk_store:
+            content_key = self._disk_store.resolve(key)
+            loaded = self._load_from_disk(key, content_key) if content_key else None
+            if loaded:
+                return loaded
+
+        with self._lock:
+            return self._miss()
+
+    def _miss(self) -> None:
+        self._misses += 1
+        return None
+
+    def get_by_content(self, content_key: str) -> Tuple[Any, Any, Any] | None:
+        """
+        Retrieve a document indexed under any cache key.
+
+        Args:
+            content_key: Document content key
+
+        Returns:
+            Tuple of (index, chunks, keyword index) if found, None otherwise
+        """
+        with self._lock:
+            if content_key in self._documents:
+                return self._touch(content_key, time.monotonic())
             return None
 
-    def set(self, key: str, index: Any, chunks: Any) -> None:
+    def set(
+        self,
+        key: str,
+        index: Any,
+        chunks: Any,
+        content_key: Optional[str] = None,
+        keyword_index: Any = None,
+    ) -> None:
         """
-        Store an entry in the cache.
+        Store an entry in the cache, evicting other documents if the memory limit is exceeded.
+        If a document with the same content key is already stored, the key is linked to it instead.
 
         Args:
             key: Cache key
             index: FAISS index
             chunks: Document chunks
+            content_key: Document content key, defaults to the cache key
+            keyword_index: BM25 index of the chunks
         """
+        content_key = content_key or key
+        size_bytes = (
+            estimate_size(index) + estimate_size(chunks) + estimate_size(keyword_index)
+        )
+
         with self._lock:
-            self._cache[key] = (index, chunks, datetime.now())
+            if key in self._cache:
+                self._remove_key(key)
+
+            if content_key in self._documents or self._fits(content_key, size_bytes):
+                self._add_document(key, content_key, index, chunks, keyword_index, size_bytes)
+
+        if self._disk_store:
+            self._disk_store.save(content_key, index, chunks, keyword_index)
+            self._disk_store.link(key, content_key)
+
+    def link(self, key: str, content_key: str) -> Tuple[Any, Any, Any] | None:
+        """
+        Point a cache key to an already stored document.
+
+        Returns:
+            Tuple of (index, chunks, keyword index) if the document is found and linked, None otherwise
+        """
+        with self._lock:
+            if content_key in self._documents:
+                if key in self._cache:
+                    self._remove_key(key)
+
+                self._add_key(key, content_key)
+                linked = self._touch(content_key, time.monotonic())
+            else:
+                linked = None
+
+        if not linked and self._disk_store:
+            linked = self._load_from_disk(key, content_key)
+
+        # The dbm write is done outside the lock, so it doesn't block lookups of other threads
+        if linked and self._disk_store:
+            self._disk_store.link(key, content_key)
+
+        return linked
+
+    def _load_from_disk(self, key: str, content_key: str) -> Tuple[Any, Any, Any] | None:
+        """Load the document from the disk tier into memory and link the key to it."""
+        loaded = self._disk_store.load(content_key)
+        if not loaded:
+            return None
+
+        index, chunks, keyword_index, size_bytes = loaded
+        with self._lock:
+            self._disk_hits += 1
+            if key in self._cache:
+                self._remove_key(key)
+
+            if content_key in self._documents or self._fits(content_key, size_bytes):
+                self._add_document(key, content_key, index, chunks, keyword_index, size_bytes)
+                return self._touch(content_key, time.monotonic())
+
+            return (index, chunks, keyword_index)
+
+    def _fits(self, content_key: str, size_bytes: int) -> bool:
+        """A document bigger than the whole memory limit is not kept in memory, it would evict all others."""
+        if size_bytes <= self._max_memory_bytes:
+            return True
+
+        logger.warning(
+            "document_not_cached",
+            content_key=content_key,
+            size_bytes=size_bytes,
+            max_memory_bytes=self._max_memory_bytes,
+        )
+        return False
+
+    def _add_document(
+        self,
+        key: str,
+        content_key: str,
+        index: Any,
+        chunks: Any,
+        keyword_index: Any,
+        size_bytes: int,
+    ) -> None:
+        if content_key not in self._documents:
+            self._documents[content_key] = _CachedDocument(
+                index=index,
+                chunks=chunks,
+                keyword_index=keyword_index,
+                size_bytes=size_bytes,
+            )
+            self._memory_bytes += size_bytes
+
+        self._add_key(key, content_key)
+        self._evict(keep=content_key)
+
+    def _touch(self, content_key: str, now: float) -> Tuple[Any, Any, Any]:
+        document = self._documents[content_key]
+        document.last_access = now
+        document.hits += 1
+        return (document.index, document.chunks, document.keyword_index)
+
+    def _add_key(self, key: str, content_key: str) -> None:
+        self._documents[content_key].keys.add(key)
+        self._cache[key] = (content_key, time.monotonic())
+
+    def _remove_key(self, key: str) -> None:
+        """Remove the cache key, and the document if no other key references it."""
+        content_key, _ = self._cache.pop(key)
+        document = self._documents[content_key]
+        document.keys.discard(key)
+
+        if not document.keys:
+            self._remove_document(content_key)
+
+    def _remove_document(self, content_key: str) -> None:
+        document = self._documents.pop(content_key)
+        self._memory_bytes -= document.size_bytes
+
+        for key in document.keys:
+            self._cache.pop(key, None)
+
+    def _evict(self, keep: str) -> None:
+        """Evict documents by the eviction policy until the memory limit is met. Never evicts `keep`."""
+        while self._memory_bytes > self._max_memory_bytes and len(self._documents) > 1:
+            candidates = (
+                (content_key, document)
+                for content_key, document in self._documents.items()
+                if content_key != keep
+            )
+
+            if self._eviction_policy == EvictionPolicy.LFU:
+                content_key, _ = min(
+                    candidates, key=lambda item: (item[1].hits, item[1].last_access)
+                )
+            else:
+                content_key, _ = min(candidates, key=lambda item: item[1].last_access)
+
+            self._remove_document(content_key)
+            self._evictions += 1
 
     def clear(self) -> None:
         """Clear all cached entries."""
         with self._lock:
             self._cache.clear()
+            self._documents.clear()
+            self._memory_bytes = 0
 
     def cleanup_old_entries(self) -> int:
         """
-        Remove entries older than 24 hours.
+        Remove cache keys that were not accessed for longer than TTL.
 
         Returns:
             Number of entries removed
         """
-        now = datetime.now()
-        cutoff_time = now - timedelta(hours=24)
+        cutoff_time = time.monotonic() - self._ttl_seconds
 
         with self._lock:
             keys_to_remove = [
-                key for key, (_, _, timestamp) in self._cache.items()
-                if timestamp < cutoff_time
+                key for key, (_, last_access) in self._cache.items()
+                if last_access < cutoff_time
             ]
 
             for key in keys_to_remove:
-                del self._cache[key]
+                if key in self._cache:
+                    self._remove_key(key)
 
             removed_count = len(keys_to_remove)
+            self._expirations += removed_count
             if removed_count > 0:
-                print(f"[DocumentCache] Cleaned up {removed_count} expired entries at {now}")
+                logger.info("document_cache_cleanup", expired=removed_count)
 
             return removed_count
 
-    def _schedule_midnight_cleanup(self) -> None:
-        """Background thread that runs cleanup at midnight every day."""
-        while not self._stop_event.is_set():
-            now = datetime.now()
-            tomorrow = now + timedelta(days=1)
-            midnight = datetime.combine(tomorrow.date(), time.min)
-            seconds_until_midnight = (midnight - now).total_seconds()
-
-            if self._stop_event.wait(timeout=seconds_until_midnight):
-                break
-
-            if not self._stop_event.is_set():
-                self.cleanup_old_entries()
+    def _schedule_cleanup(self) -> None:
+        """Background thread that removes expired entries every sweep interval."""
+        while not self._stop_event.wait(timeout=self._sweep_interval_seconds):
+            self.cleanup_old_entries()
 
     def start_cleanup_task(self) -> None:
         """Start the background cleanup thread."""
@@ -103,12 +385,15 @@ class DocumentCache:
             self._running = True
             self._stop_event.clear()
             self._cleanup_thread = threading.Thread(
-                target=self._schedule_midnight_cleanup,
+                target=self._schedule_cleanup,
                 daemon=True,
                 name="DocumentCache-Cleanup"
             )
             self._cleanup_thread.start()
-            print("[DocumentCache] Started automatic cleanup thread (runs at midnight)")
+            logger.info(
+                "document_cache_cleanup_started",
+                interval_seconds=self._sweep_interval_seconds,
+            )
 
     def stop_cleanup_task(self) -> None:
         """Stop the background cleanup thread."""
@@ -117,13 +402,46 @@ class DocumentCache:
             self._stop_event.set()
             if self._cleanup_thread and self._cleanup_thread.is_alive():
                 self._cleanup_thread.join(timeout=5)
-            print("[DocumentCache] Stopped automatic cleanup thread")
+            logger.info("document_cache_cleanup_stopped")
+
+    def close(self) -> None:
+        """Stop the cleanup thread and close the disk store. Called on app shutdown."""
+        self.stop_cleanup_task()
+        if self._disk_store:
+            self._disk_store.close()
 
     def size(self) -> int:
         """Return the number of cached entries."""
         with self._lock:
             return len(self._cache)
 
+    def document_count(self) -> int:
+        """Return the number of distinct stored documents."""
+        with self._lock:
+            return len(self._documents)
+
+    def memory_bytes(self) -> int:
+        """Return the estimated memory footprint of stored documents."""
+        with self._lock:
+            return self._memory_bytes
+
+    def stats(self) -> dict[str, int]:
+        """Return cache counters and sizes."""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "disk_hits": self._disk_hits,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "entries": len(self._cache),
+                "documents": len(self._documents),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self._max_memory_bytes,
+            }
+
     def __contains__(self, key: str) -> bool:
-        """Check if a key exists in the cache (and is not expired)."""
-        return self.get(key) is not None
\ No newline at end of file
+        """Check if a key is cached in memory and not expired, without counting a hit or refreshing its TTL."""
+        with self._lock:
+            entry = self._cache.get(key)
+            return entry is not None and time.monotonic() - entry[1] < self._ttl_seconds
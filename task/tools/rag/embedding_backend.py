@@ -0,0 +1,130 @@
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from utils.startup import lazy_import
+
+onnxruntime = lazy_import("onnxruntime")
+sentence_transformers = lazy_import("sentence_transformers")
+tokenizers = lazy_import("tokenizers")
+
+
+class EmbeddingBackend(ABC):
+    """Sentence embedding model used by `EmbeddingService`. `encode` is called from a single worker thread."""
+
+    @property
+    @abstractmethod
+    def model_name(self) -> str:
+        """Identifies the model and runtime; part of cache keys, so indexes of different backends are never mixed."""
+        pass
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        pass
+
+    @abstractmethod
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Return L2-normalized float32 embeddings of shape (len(texts), dimension)."""
+        pass
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Default backend: SentenceTransformer model on PyTorch, loaded on first use."""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        self._model_name = model_name
+        self._transformer = None
+        self._lock = threading.Lock()
+
+    @property
+    def transformer(self):
+        if self._transformer is None:
+            with self._lock:
+                if self._transformer is None:
+                    self._transformer = sentence_transformers.SentenceTransformer(
+                        model_name_or_path=self._model_name
+                    )
+        return self._transformer
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    @property
+    def dimension(self) -> int:
+        return self.transformer.get_sentence_embedding_dimension()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(self.transformer.encode(texts), dtype="float32")
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    Runs an ONNX export of a sentence-transformers model (e.g. all-MiniLM-L6-v2) with ONNX Runtime,
+    without PyTorch. Works the same with a dynamically quantized int8 model file.
+
+    `model_dir` is a local directory with the ONNX model and `tokenizer.json`, e.g. the `onnx`
+    folder of the Hugging Face model repo or an `optimum-cli export onnx` output. Token embeddings
+    are mean-pooled over the attention mask and L2-normalized, as in the sentence-transformers
+    pipeline of the model.
+    """
+
+    def __init__(
+        self,
+        model_dir: str | Path,
+        model_file: str = "model.onnx",
+        model_name: Optional[str] = None,
+        max_length: int = 256,
+        intra_op_threads: int = 0,
+    ):
+        model_dir = Path(model_dir)
+        self._model_name = model_name or f"{model_dir.name}/{model_file}"
+
+        tokenizer_path = model_dir / "tokenizer.json"
+        if not tokenizer_path.exists():
+            tokenizer_path = model_dir.parent / "tokenizer.json"
+        self._tokenizer = tokenizers.Tokenizer.from_file(str(tokenizer_path))
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 lets ONNX Runtime use all cores
+        options.intra_op_num_threads = intra_op_threads
+        self._session = onnxruntime.InferenceSession(
+            str(model_dir / model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+        self._dimension = self._session.get_outputs()[0].shape[-1]
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    @property
+    def dimension(self) -> int:
+        if not isinstance(self._dimension, int):
+            # Dynamic output shape, resolved by running the model once
+            self._dimension = self.encode([""]).shape[1]
+        return self._dimension
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype="int64")
+        attention_mask = np.array(
+            [encoding.attention_mask for encoding in encodings], dtype="int64"
+        )
+
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self._session.run(None, inputs)[0]
+
+        mask = attention_mask[:, :, None].astype("float32")
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings.astype("float32")
@@ -0,0 +1,170 @@
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Optional
+
+import numpy as np
+from tools.rag.embedding_backend import EmbeddingBackend, SentenceTransformerBackend
+from tools.rag.query_embedding_cache import QueryEmbeddingCache
+from utils.startup import startup_phase
+
+
+class EmbeddingPriority(IntEnum):
+    """Lower value is encoded first."""
+
+    QUERY = 0
+    BULK = 1
+
+
+@dataclass
+class _EncodeRequest:
+    future: asyncio.Future
+    embeddings: list[Optional[np.ndarray]]
+    remaining: int = field(init=False)
+
+    def __post_init__(self):
+        self.remaining = len(self.embeddings)
+
+
+class EmbeddingService:
+    """
+    Owns the embedding backend (SentenceTransformer by default) and runs it on a dedicated executor,
+    off the event loop.
+
+    Texts of concurrent `encode` calls are merged into micro-batches: the worker collects up to
+    `max_batch_size` texts, waiting at most `max_wait_ms` for more to arrive, and encodes them in one
+    forward pass. Queries are queued with higher priority than bulk ingestion, so a question about
+    an indexed document doesn't wait until a large upload of another one is embedded.
+
+    With `query_cache`, query embeddings are looked up before queuing, so a repeated query doesn't
+    reach the model at all.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[EmbeddingBackend] = None,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ):
+        self.backend = backend or SentenceTransformerBackend()
+        self.model_name = self.backend.model_name
+        self.query_cache = query_cache
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="EmbeddingService"
+        )
+        self._sequence = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def dimension(self) -> int:
+        return self.backend.dimension
+
+    async def warm_up(self) -> None:
+        """Load the model and run one forward pass on the service executor, ahead of the first request."""
+        with startup_phase(f"load embedding model {self.model_name}"):
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.backend.encode, ["warm-up"]
+            )
+
+    def encode(
+        self, texts: list[str], priority: EmbeddingPriority = EmbeddingPriority.BULK
+    ) -> asyncio.Future:
+        """
+        Schedule texts for encoding.
+
+        Returns:
+            Future with float32 embeddings of shape (len(texts), dimension)
+        """
+        self.__ensure_worker()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if not texts:
+            future.set_result(np.empty((0, self.dimension), dtype="float32"))
+            return future
+
+        request = _EncodeRequest(future=future, embeddings=[None] * len(texts))
+        for position, text in enumerate(texts):
+            self._queue.put_nowait(
+                (priority, next(self._sequence), text, request, position)
+            )
+
+        return future
+
+    def encode_query(self, query: str) -> asyncio.Future:
+        """Schedule a search query for encoding ahead of bulk ingestion. Future result has shape (1, dimension)."""
+        if self.query_cache is None:
+            return self.encode([query], priority=EmbeddingPriority.QUERY)
+
+        key = self.query_cache.make_key(self.model_name, query)
+        embedding = self.query_cache.get(key)
+        if embedding is not None:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(embedding)
+            return future
+
+        future = self.encode([query], priority=EmbeddingPriority.QUERY)
+        future.add_done_callback(lambda done: self.__cache_query(key, done))
+        return future
+
+    def __cache_query(self, key: str, future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.query_cache.set(key, future.result())
+
+    def __ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.PriorityQueue()
+            self._worker = asyncio.create_task(
+                self.__run(), name="EmbeddingService-batcher"
+            )
+
+    async def __run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+
+            while len(batch) < self._max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Texts of cancelled requests are not worth a forward pass
+            batch = [item for item in batch if not item[3].future.done()]
+            if not batch:
+                continue
+
+            texts = [text for _, _, text, _, _ in batch]
+            try:
+                embeddings = await loop.run_in_executor(
+                    self._executor, self.backend.encode, texts
+                )
+            except Exception as e:
+                for _, _, _, request, _ in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            embeddings = np.asarray(embeddings, dtype="float32")
+            for (_, _, _, request, position), embedding in zip(batch, embeddings):
+                request.embeddings[position] = embedding
+                request.remaining -= 1
+
+                if request.remaining == 0 and not request.future.done():
+                    request.future.set_result(np.stack(request.embeddings))
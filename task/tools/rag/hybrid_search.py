@@ -0,0 +1,201 @@
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Words, plus compound tokens like part numbers, error codes and model names (`XR-500`, `E.21`)
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+_TOKEN_PART_PATTERN = re.compile(r"\w+")
+
+_RRF_K = 60
+
+_EMPTY_SCORES = np.empty(0, dtype="float64")
+_EMPTY_IDS = np.empty(0, dtype="int64")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased tokens; compound tokens are emitted both whole and split into parts."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = _TOKEN_PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class KeywordIndex:
+    """
+    BM25 ranker over document chunks.
+
+    Postings are kept in CSR layout (per term: chunk ids and term frequencies), so a query is scored
+    with a handful of vectorized NumPy operations over the postings of its terms.
+    """
+
+    def __init__(
+        self,
+        vocabulary: dict[str, int],
+        indptr: np.ndarray,
+        chunk_ids: np.ndarray,
+        term_frequencies: np.ndarray,
+        chunk_lengths: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self._vocabulary = vocabulary
+        self._indptr = indptr
+        self._chunk_ids = chunk_ids
+        self._term_frequencies = term_frequencies
+        self._chunk_lengths = chunk_lengths
+        self._k1 = k1
+        self._b = b
+
+        chunk_count = len(chunk_lengths)
+        document_frequencies = np.diff(indptr)
+        self._idf = np.log(
+            1 + (chunk_count - document_frequencies + 0.5) / (document_frequencies + 0.5)
+        ).astype("float32")
+
+        average_length = chunk_lengths.mean() if chunk_count else 1.0
+        self._length_norm = (
+            k1 * (1 - b + b * chunk_lengths / max(average_length, 1e-9))
+        ).astype("float32")
+
+    @classmethod
+    def build(cls, chunks: Sequence[str]) -> "KeywordIndex":
+        vocabulary: dict[str, int] = {}
+        term_ids = []
+        chunk_ids = []
+        term_frequencies = []
+        chunk_lengths = np.zeros(len(chunks), dtype="float32")
+
+        for chunk_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            chunk_lengths[chunk_id] = len(tokens)
+
+            for token, frequency in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                chunk_ids.append(chunk_id)
+                term_frequencies.append(frequency)
+
+        term_ids = np.asarray(term_ids, dtype="int64")
+        order = np.argsort(term_ids, kind="stable")
+
+        indptr = np.zeros(len(vocabulary) + 1, dtype="int64")
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=indptr[1:])
+
+        return cls(
+            vocabulary=vocabulary,
+            indptr=indptr,
+            chunk_ids=np.asarray(chunk_ids, dtype="int32")[order],
+            term_frequencies=np.asarray(term_frequencies, dtype="float32")[order],
+            chunk_lengths=chunk_lengths,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        vocabulary_size = sum(len(term) + 64 for term in self._vocabulary)
+        return int(
+            vocabulary_size
+            + self._indptr.nbytes
+            + self._chunk_ids.nbytes
+            + self._term_frequencies.nbytes
+            + self._chunk_lengths.nbytes
+            + self._idf.nbytes
+            + self._length_norm.nbytes
+        )
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find up to `k` best matching chunks. Chunks without query terms are skipped.
+
+        Returns:
+            Tuple of (BM25 scores, chunk ids), best first
+        """
+        term_ids = [
+            self._vocabulary[token]
+            for token in set(tokenize(query))
+            if token in self._vocabulary
+        ]
+        if not term_ids:
+            return _EMPTY_SCORES, _EMPTY_IDS
+
+        starts = self._indptr[term_ids]
+        ends = self._indptr[np.asarray(term_ids) + 1]
+        postings = np.concatenate(
+            [np.arange(start, end) for start, end in zip(starts, ends)]
+        )
+        posting_idf = np.repeat(self._idf[term_ids], ends - starts)
+
+        chunk_ids = self._chunk_ids[postings]
+        frequencies = self._term_frequencies[postings]
+        contributions = (
+            posting_idf
+            * frequencies
+            * (self._k1 + 1)
+            / (frequencies + self._length_norm[chunk_ids])
+        )
+
+        scores = np.bincount(
+            chunk_ids, weights=contributions, minlength=len(self._chunk_lengths)
+        )
+        matched = np.flatnonzero(scores)
+        k = min(k, len(matched))
+        if k == 0:
+            return _EMPTY_SCORES, _EMPTY_IDS
+        best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return scores[best], best
+
+    def save(self, path: Path) -> None:
+        """Save to an uncompressed `.npz` file."""
+        terms = np.empty(len(self._vocabulary), dtype=object)
+        for term, term_id in self._vocabulary.items():
+            terms[term_id] = term
+
+        with open(path, "wb") as file:
+            np.savez(
+                file,
+                terms=terms.astype("U"),
+                indptr=self._indptr,
+                chunk_ids=self._chunk_ids,
+                term_frequencies=self._term_frequencies,
+                chunk_lengths=self._chunk_lengths,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "KeywordIndex":
+        with np.load(path) as data:
+            return cls(
+                vocabulary={term: term_id for term_id, term in enumerate(data["terms"].tolist())},
+                indptr=data["indptr"],
+                chunk_ids=data["chunk_ids"],
+                term_frequencies=data["term_frequencies"],
+                chunk_lengths=data["chunk_lengths"],
+            )
+
+
+def reciprocal_rank_fusion(
+    rankings: list[np.ndarray], k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge rankings of chunk ids with reciprocal-rank fusion: score = sum(1 / (60 + rank)).
+
+    Returns:
+        Tuple of (fused scores, chunk ids) of up to `k` best chunks, best first
+    """
+    rankings = [ranking[ranking >= 0] for ranking in rankings]
+    if not any(len(ranking) for ranking in rankings):
+        return _EMPTY_SCORES, _EMPTY_IDS
+
+    ids = np.concatenate(rankings).astype("int64")
+    scores = np.concatenate(
+        [1.0 / (_RRF_K + 1 + np.arange(len(ranking))) for ranking in rankings]
+    )
+
+    unique_ids, inverse = np.unique(ids, return_inverse=True)
+    fused = np.bincount(inverse, weights=scores)
+    order = np.argsort(-fused, kind="stable")[:k]
+    return fused[order], unique_ids[order]
@@ -0,0 +1,176 @@
+import math
+from enum import Enum
+
+import numpy as np
+from utils.startup import lazy_import
+
+faiss = lazy_import("faiss")
+
+
+class IndexType(str, Enum):
+    FLAT = "flat"
+    HNSW = "hnsw"
+    IVF_PQ = "ivf_pq"
+
+
+class VectorEncoding(str, Enum):
+    """
+    How flat and HNSW indexes store vectors: float32 (4 bytes per dimension), 8-bit scalar quantization
+    (1 byte per dimension) or product quantization (1 byte per 8 dimensions). IVF-PQ always stores
+    PQ codes.
+    """
+
+    FLOAT32 = "float32"
+    INT8 = "int8"
+    PQ = "pq"
+
+
+class RecallTarget(str, Enum):
+    """Trade-off between search quality and latency/memory of the built index."""
+
+    HIGH = "high"
+    BALANCED = "balanced"
+    FAST = "fast"
+
+
+# Max chunk count for brute force and for HNSW per recall target, bigger documents use IVF-PQ
+_THRESHOLDS: dict[RecallTarget, tuple[int, int]] = {
+    RecallTarget.HIGH: (50_000, 1_000_000),
+    RecallTarget.BALANCED: (10_000, 200_000),
+    RecallTarget.FAST: (5_000, 50_000),
+}
+
+_HNSW_M = 32
+_HNSW_EF_CONSTRUCTION = 40
+_HNSW_EF_SEARCH: dict[RecallTarget, int] = {
+    RecallTarget.HIGH: 128,
+    RecallTarget.BALANCED: 64,
+    RecallTarget.FAST: 32,
+}
+
+# Fraction of IVF lists probed per query
+_IVF_PROBE_RATIO: dict[RecallTarget, float] = {
+    RecallTarget.HIGH: 0.1,
+    RecallTarget.BALANCED: 0.05,
+    RecallTarget.FAST: 0.02,
+}
+_PQ_NBITS = 8
+_PQ_MIN_TRAINING_POINTS = 2**_PQ_NBITS * 39
+_MAX_TRAINING_POINTS = 100_000
+
+
+def select_index_type(chunk_count: int, recall_target: RecallTarget) -> IndexType:
+    """Pick the index type for the number of chunks and the recall target."""
+    flat_limit, hnsw_limit = _THRESHOLDS[recall_target]
+
+    if chunk_count <= flat_limit:
+        return IndexType.FLAT
+    if chunk_count <= hnsw_limit or chunk_count < _PQ_MIN_TRAINING_POINTS:
+        return IndexType.HNSW
+    return IndexType.IVF_PQ
+
+
+def build_index(
+    embeddings: np.ndarray,
+    recall_target: RecallTarget = RecallTarget.BALANCED,
+    index_type: IndexType | None = None,
+    vector_encoding: VectorEncoding = VectorEncoding.FLOAT32,
+) -> "faiss.Index":
+    """
+    Build and fill an L2 index for the embeddings.
+    Training is CPU-heavy (FAISS releases the GIL), so call it from an executor, not the event loop.
+
+    Args:
+        embeddings: float32 array of shape (n, dimension)
+        recall_target: Quality/latency trade-off
+        index_type: Force the index type instead of selecting it by chunk count
+        vector_encoding: Vector storage of flat and HNSW indexes. PQ codebooks outweigh the saved
+            bytes on small documents and can't be trained on few vectors, so below the PQ training
+            minimum int8 is used instead.
+    """
+    chunk_count, dimension = embeddings.shape
+    index_type = index_type or select_index_type(chunk_count, recall_target)
+
+    if vector_encoding == VectorEncoding.PQ and chunk_count < _PQ_MIN_TRAINING_POINTS:
+        vector_encoding = VectorEncoding.INT8
+
+    if index_type == IndexType.HNSW:
+        if vector_encoding == VectorEncoding.INT8:
+            index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_8bit, _HNSW_M)
+        elif vector_encoding == VectorEncoding.PQ:
+            index = faiss.IndexHNSWPQ(dimension, _pq_subquantizers(dimension), _HNSW_M)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, _HNSW_M)
+        index.hnsw.efConstruction = _HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = _HNSW_EF_SEARCH[recall_target]
+    elif index_type == IndexType.IVF_PQ:
+        if chunk_count < _PQ_MIN_TRAINING_POINTS:
+            raise ValueError(
+                f"IVF-PQ needs at least {_PQ_MIN_TRAINING_POINTS} vectors, got {chunk_count}"
+            )
+
+        nlist = max(1, int(4 * math.sqrt(chunk_count)))
+        index = faiss.index_factory(
+            dimension, f"IVF{nlist},PQ{_pq_subquantizers(dimension)}x{_PQ_NBITS}"
+        )
+        index.nprobe = max(1, int(nlist * _IVF_PROBE_RATIO[recall_target]))
+    elif vector_encoding == VectorEncoding.INT8:
+        index = faiss.IndexScalarQuantizer(
+            dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2
+        )
+    elif vector_encoding == VectorEncoding.PQ:
+        index = faiss.IndexPQ(dimension, _pq_subquantizers(dimension), _PQ_NBITS)
+    else:
+        index = faiss.IndexFlatL2(dimension)
+
+    if not index.is_trained:
+        index.train(_training_points(embeddings))
+
+    index.add(embeddings)
+    if index_type == IndexType.IVF_PQ:
+        # Lets MMR re-ranking reconstruct the (approximate) vectors of search results
+        index.make_direct_map()
+    return index
+
+
+def finalize_index(
+    index: "faiss.Index",
+    recall_target: RecallTarget = RecallTarget.BALANCED,
+    vector_encoding: VectorEncoding = VectorEncoding.FLOAT32,
+) -> "faiss.Index":
+    """
+    Convert a flat float32 index filled incrementally into the index type selected for its size and
+    into the vector encoding. Returns the index itself if it already is the right one.
+    Rebuilding is CPU-heavy, so call it from an executor, not the event loop.
+    """
+    chunk_count = index.ntotal
+    if (
+        select_index_type(chunk_count, recall_target) == IndexType.FLAT
+        and vector_encoding == VectorEncoding.FLOAT32
+    ):
+        return index
+
+    return build_index(
+        index.reconstruct_n(0, chunk_count),
+        recall_target,
+        vector_encoding=vector_encoding,
+    )
+
+
+def _training_points(embeddings: np.ndarray) -> np.ndarray:
+    """A random sample is enough to train the quantizers of a large corpus."""
+    if len(embeddings) <= _MAX_TRAINING_POINTS:
+        return embeddings
+
+    sample = np.random.default_rng(0).choice(
+        len(embeddings), _MAX_TRAINING_POINTS, replace=False
+    )
+    return embeddings[sample]
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest sub-quantizer count with at most 8 dimensions per sub-vector that divides the dimension."""
+    for sub_dimension in range(8, 0, -1):
+        if dimension % sub_dimension == 0:
+            return dimension // sub_dimension
+    return dimension
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional
+
+from tools.rag.embedding_service import EmbeddingService
+from utils.startup import lazy_import
+from utils.tracing import tracer
+
+faiss = lazy_import("faiss")
+
+
+@dataclass
+class IngestedDocument:
+    index: Any
+    """Flat float32 index of all chunks, in chunk order."""
+    chunks: list[str]
+    content_key: str
+    """Hex digest of the content hash over all pages joined with "\\n"."""
+
+
+async def ingest_pages(
+    pages: AsyncIterator[str],
+    text_splitter: Any,
+    embedding_service: EmbeddingService,
+    content_hash: Any,
+    batch_size: int = 64,
+) -> Optional[IngestedDocument]:
+    """
+    Chunk, embed and index a document while its pages are still being extracted.
+
+    Pages are split incrementally: the last chunk of the text seen so far may still grow, so it is
+    carried over and split again together with the next page. Chunk boundaries near page breaks
+    can differ from splitting the whole text at once, but are deterministic for the same pages, so
+    the same document is always chunked the same way. Complete chunks are sent to the embedding
+    service in batches, and vectors are added to the index as each batch is encoded, so parsing,
+    embedding and indexing overlap. Only the chunk texts and the index are kept; the index holds
+    every vector, and the page texts stay in the extracted text cache.
+
+    Args:
+        pages: Page texts in document order
+        text_splitter: LangChain text splitter
+        embedding_service: Service that encodes the chunks
+        content_hash: `hashlib` hash, already updated with the indexing config; updated with the text
+        batch_size: Chunks per embedding request
+
+    Returns:
+        Ingested document, None if the document has no text
+
+    Traced as overlapping `rag.extract` and `rag.split` spans over the page loop, with the time spent
+    waiting for pages and splitting them as attributes, and a `rag.embed` span per batch.
+    """
+    chunks: list[str] = []
+    encoded: asyncio.Queue[Optional[asyncio.Future]] = asyncio.Queue()
+    pending: list[asyncio.Future] = []
+    index = None
+
+    async def add_vectors() -> None:
+        nonlocal index
+        while (future := await encoded.get()) is not None:
+            embeddings = await future
+            if index is None:
+                index = faiss.IndexFlatL2(embeddings.shape[1])
+            index.add(embeddings)
+
+    def submit(batch: list[str]) -> None:
+        chunks.extend(batch)
+        span = tracer.start_span("rag.embed", chunks=len(batch))
+        future = embedding_service.encode(batch)
+        future.add_done_callback(lambda _: span.end())
+        pending.append(future)
+        encoded.put_nowait(future)
+
+    indexer = asyncio.create_task(add_vectors())
+    extract_span = tracer.start_span("rag.extract")
+    split_span = tracer.start_span("rag.split")
+    page_count = 0
+    extract_wait = 0.0
+    split_time = 0.0
+    try:
+        tail = None
+        batch: list[str] = []
+
+        mark = time.perf_counter()
+        async for page in pages:
+            page_start = time.perf_counter()
+            extract_wait += page_start - mark
+            page_count += 1
+
+            content_hash.update(("\n" + page if tail is not None else page).encode("utf-8"))
+            text = page if tail is None else f"{tail}\n{page}"
+
+            split = text_splitter.split_text(text) if text.strip() else []
+            mark = time.perf_counter()
+            split_time += mark - page_start
+            if split:
+                batch.extend(split[:-1])
+                tail = split[-1]
+            elif tail is None:
+                tail = ""
+
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+
+        extract_span.set_attribute("pages", page_count)
+        extract_span.set_attribute("wait_ms", extract_wait * 1000)
+        extract_span.end()
+        split_span.set_attribute("busy_ms", split_time * 1000)
+        split_span.end()
+
+        if tail:
+            batch.append(tail)
+        if batch:
+            submit(batch)
+
+        encoded.put_nowait(None)
+        await indexer
+    except BaseException as e:
+        extract_span.end(error=e)
+        split_span.end(error=e)
+        raise
+    finally:
+        if not indexer.done():
+            indexer.cancel()
+            for future in pending:
+                future.cancel()
+
+    if not chunks:
+        return None
+
+    return IngestedDocument(
+        index=index, chunks=chunks, content_key=content_hash.hexdigest()
+    )
@@ -0,0 +1,78 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe, bounded LRU cache of query embeddings, shared across conversations.
+
+    Entries are keyed by model name plus normalized query text (Unicode NFKC, case-folded, collapsed
+    whitespace), so repeated and trivially reworded queries skip the model forward pass. Case
+    folding is safe for the uncased default model; cached embeddings are read-only arrays.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, query: str) -> str:
+        normalized = _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query)).strip().casefold()
+        return f"{model_name}|{normalized}"
+
+    def get(self, key: str) -> np.ndarray | None:
+        """
+        Retrieve a cached embedding and mark it as recently used.
+
+        Returns:
+            Embedding of shape (1, dimension) if found, None otherwise
+        """
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is None:
+                self._misses += 1
+                return None
+
+            self._cache.move_to_end(key)
+            self._hits += 1
+            return embedding
+
+    def set(self, key: str, embedding: np.ndarray) -> None:
+        """Store an embedding, evicting the least recently used entry if the limit is exceeded."""
+        embedding.setflags(write=False)
+
+        with self._lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+
+    def clear(self) -> None:
+        """Clear all cached entries."""
+        with self._lock:
+            self._cache.clear()
+
+    def size(self) -> int:
+        """Return the number of cached entries."""
+        with self._lock:
+            return len(self._cache)
+
+    def stats(self) -> dict[str, int]:
+        """Return cache counters and sizes."""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "entries": len(self._cache),
+                "max_entries": self._max_entries,
+            }
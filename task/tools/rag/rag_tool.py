@@ -1,16 +1,30 @@
+import asyncio
+import hashlib
 import json
-from typing import Any
+from functools import cached_property
+from typing import Any, AsyncIterator, Tuple
 
-import faiss
 import numpy as np
-from aidial_client import AsyncDial
 from aidial_sdk.chat_completion import Message, Role
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
 from tools.base import BaseTool
 from tools.models import ToolCallParams
 from tools.rag.document_cache import DocumentCache
+from tools.rag.embedding_service import EmbeddingService
+from tools.rag.hybrid_search import KeywordIndex, reciprocal_rank_fusion
+from tools.rag.index_factory import RecallTarget, finalize_index
+from tools.rag.ingestion import ingest_pages
+from tools.rag.reranking import max_marginal_relevance
+from utils.dial_client_registry import DialClientRegistry
 from utils.dial_file_conent_extractor import DialFileContentExtractor
+from utils.extracted_text_cache import ExtractedTextCache
+from utils.metrics import observe_llm_stream
+from utils.startup import import_modules, lazy_import
+from utils.structured_logging import get_logger
+from utils.tracing import tracer
+
+langchain_text_splitters = lazy_import("langchain_text_splitters")
+
+logger = get_logger("rag_tool")
 
 _SYSTEM_PROMPT = """
 You are a RAG-powered assistant that assists users with their questions.
@@ -26,26 +40,70 @@ You are a RAG-powered assistant that assists users with their questions.
 """
 
 
+_CHUNK_SIZE = 500
+_CHUNK_OVERLAP = 50
+# Rough estimate for the context token budget, avoids running a tokenizer per chunk
+_CHARS_PER_TOKEN = 4
+
+
 class RagTool(BaseTool):
     """
     Performs semantic search on documents to find and answer questions based on relevant content.
     Supports: PDF, TXT, CSV, HTML.
+
+    Retrieval is hybrid: dense (FAISS) and keyword (BM25) rankings are merged with reciprocal-rank
+    fusion, so exact identifiers like part numbers or error codes are found even when their
+    embeddings are not close to the query.
     """
 
     def __init__(
-        self, endpoint: str, deployment_name: str, document_cache: DocumentCache
+        self,
+        endpoint: str,
+        deployment_name: str,
+        document_cache: DocumentCache,
+        text_cache: ExtractedTextCache,
+        embedding_service: EmbeddingService,
+        client_registry: DialClientRegistry,
+        recall_target: RecallTarget = RecallTarget.BALANCED,
+        top_k: int = 5,
+        fetch_k: int = 20,
+        mmr_lambda: float = 0.7,
+        context_token_budget: int = 3000,
     ):
+        """
+        Args:
+            top_k: Chunks selected per searched document
+            fetch_k: Candidates taken per document from each ranker and re-ranked with MMR
+            mmr_lambda: MMR trade-off, 1 ranks by relevance only, 0 by diversity only
+            context_token_budget: Max estimated tokens of the RAG context sent to the completion
+        """
         self.endpoint = endpoint
         self.deployment_name = deployment_name
         self.document_cache = document_cache
-        self.transformer = SentenceTransformer(model_name_or_path="all-MiniLM-L6-v2")
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50,
+        self.text_cache = text_cache
+        self.embedding_service = embedding_service
+        self.client_registry = client_registry
+        self.recall_target = recall_target
+        self.top_k = top_k
+        self.fetch_k = fetch_k
+        self.mmr_lambda = mmr_lambda
+        self.context_token_budget = context_token_budget
+
+    @cached_property
+    def text_splitter(self):
+        return langchain_text_splitters.RecursiveCharacterTextSplitter(
+            chunk_size=_CHUNK_SIZE,
+            chunk_overlap=_CHUNK_OVERLAP,
             length_function=len,
             separators=["\n\n", "\n", ". ", " ", ""],
         )
 
+    async def warm_up(self) -> None:
+        await asyncio.gather(
+            asyncio.to_thread(import_modules, "faiss", "langchain_text_splitters"),
+            self.embedding_service.warm_up(),
+        )
+
     @property
     def show_in_stage(self) -> bool:
         return False
@@ -59,6 +117,7 @@ class RagTool(BaseTool):
         return """
     Performs semantic search on documents to find and answer questions based on relevant content.
     Use this tool when user wants to perform search on large document.
+    Pass all documents the question is about in one call, they are searched together.
     Supports: PDF, TXT, CSV, HTML.
     """
 
@@ -69,70 +128,93 @@ class RagTool(BaseTool):
             "properties": {
                 "request": {
                     "type": "string",
-                    "description": "The search query or question to search for in the document",
+                    "description": "The search query or question to search for in the documents",
+                },
+                "file_urls": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "URLs of the files to search in",
                 },
-                "file_url": {"type": "string", "description": "File URL"},
             },
-            "required": ["request", "file_url"],
+            "required": ["request", "file_urls"],
         }
 
     async def _execute(self, tool_call_params: ToolCallParams) -> str | Message:
         args = json.loads(tool_call_params.tool_call.function.arguments)
         request = args["request"]
-        file_url = args["file_url"]
+        # A single URL, also under the former `file_url` parameter, is searched as a one-document list
+        file_urls = args.get("file_urls", args.get("file_url")) or []
+        if isinstance(file_urls, str):
+            file_urls = [file_urls]
+        file_urls = list(dict.fromkeys(file_urls))
 
         stage = tool_call_params.stage
         stage.append_content("## Request arguments: \n")
         stage.append_content(f"**Request**: {request}\n\r")
-        stage.append_content(f"**File URL**: {file_url}\n\r")
-
-        cache_document_key = f"{tool_call_params.conversation_id}-{file_url}"
-
-        cache = self.document_cache.get(cache_document_key)
-
-        if cache:
-            index, chunks = cache
-        else:
-            text_content = DialFileContentExtractor(
-                self.endpoint, tool_call_params.api_key
-            ).extract_text(file_url)
-
-            if not text_content:
-                stage.append_content("**File content is not found!**")
-                return "File content is not found"
-
-            chunks = self.text_splitter.split_text(text_content)
-            embeddings = self.transformer.encode(chunks)
-            index = faiss.IndexFlatL2(384)
-            index.add(np.array(embeddings).astype("float32"))
-            self.document_cache.set(cache_document_key, index, chunks)
-
-            query_embedding = self.transformer.encode([request]).astype("float32")
-            _, indices = index.search(query_embedding, k=3)
-
-            retrieved_chunks = [chunks[idx] for idx in indices[0]]
-            augmented_prompt = self.__augmentation(request, retrieved_chunks)
-            stage.append_content("## RAG Request: \n")
-            stage.append_content(f"```text\n\r{augmented_prompt}\n\r```\n\r")
-            stage.append_content("## Response: \n")
-
-            dial_client = AsyncDial(
-                base_url=self.endpoint,
-                api_version="2025-01-01-preview",
-                api_key=tool_call_params.api_key,
-            )
+        for file_url in file_urls:
+            stage.append_content(f"**File URL**: {file_url}\n\r")
+
+        # Scheduled first, so the query is encoded ahead of the document chunks
+        query_span = tracer.start_span("rag.embed_query")
+        query_embedding_future = self.embedding_service.encode_query(request)
+        query_embedding_future.add_done_callback(lambda _: query_span.end())
+
+        loaded = await asyncio.gather(
+            *(self.__load_document(file_url, tool_call_params) for file_url in file_urls),
+            return_exceptions=True,
+        )
+
+        documents = []
+        for file_url, document in zip(file_urls, loaded):
+            if isinstance(document, BaseException):
+                if not isinstance(document, Exception):
+                    raise document
+                # A failing document doesn't fail the search in the others
+                logger.warning("rag_document_failed", file_url=file_url, error=str(document))
+                document = None
+
+            if document:
+                documents.append((file_url, *document))
+            else:
+                stage.append_content(f"**File content is not found: {file_url}**\n\r")
+
+        if not documents:
+            query_embedding_future.cancel()
+            return "File content is not found"
 
-            stream = await dial_client.chat.completions.create(
+        query_embedding = await query_embedding_future
+        with tracer.span("rag.search", documents=len(documents)) as span:
+            retrieved = self.__retrieve(request, query_embedding, documents)
+            span.set_attribute("chunks", len(retrieved))
+
+        augmented_prompt = self.__augmentation(
+            request, retrieved, with_sources=len(documents) > 1
+        )
+        stage.append_content("## RAG Request: \n")
+        stage.append_content(f"```text\n\r{augmented_prompt}\n\r```\n\r")
+        stage.append_content("## Response: \n")
+
+        dial_client = self.client_registry.get_async_client(
+            endpoint=self.endpoint,
+            api_key=tool_call_params.api_key,
+            api_version="2025-01-01-preview",
+        )
+
+        stream = observe_llm_stream(
+            self.deployment_name,
+            dial_client.chat.completions.create(
                 messages=[
                     {"role": Role.SYSTEM, "content": _SYSTEM_PROMPT},
                     {"role": Role.USER, "content": augmented_prompt},
                 ],
                 deployment_name=self.deployment_name,
                 stream=True,
-            )
+            ),
+        )
 
-            content = ""
+        content = ""
 
+        with tracer.span("rag.completion", deployment=self.deployment_name):
             async for chunk in stream:
                 if chunk.choices and len(chunk.choices) > 0:
                     delta = chunk.choices[0].delta
@@ -140,8 +222,187 @@ class RagTool(BaseTool):
                         tool_call_params.stage.append_content(delta.content)
                         content += delta.content
 
-            return content
+        return content
+
+    async def __load_document(
+        self, file_url: str, tool_call_params: ToolCallParams
+    ) -> Tuple[Any, Any, Any] | None:
+        """
+        Return the indexed document from the cache, or extract and index it.
+
+        Returns:
+            Tuple of (index, chunks, keyword index), None if the file has no content
+        """
+        with tracer.span("rag.load_document", file_url=file_url) as span:
+            cache_document_key = f"{tool_call_params.conversation_id}-{file_url}"
+
+            # Off the event loop, a document may be loaded from the disk tier
+            cache = await asyncio.to_thread(self.document_cache.get, cache_document_key)
+            if cache:
+                span.set_attribute("source", "cache")
+                return cache
+
+            extractor = DialFileContentExtractor(
+                self.endpoint, tool_call_params.api_key, self.text_cache, self.client_registry
+            )
+
+            # Same content indexed with the same config is shared between conversations. With already
+            # extracted text the content key is known upfront, so shared documents are never re-indexed.
+            cached_pages = await extractor.get_cached_pages(file_url)
+            if cached_pages is not None:
+                content_hash = self.__content_hash()
+                content_hash.update("\n".join(cached_pages).encode("utf-8"))
+
+                shared = await asyncio.to_thread(
+                    self.document_cache.link, cache_document_key, content_hash.hexdigest()
+                )
+                if shared:
+                    span.set_attribute("source", "shared")
+                    return shared
+
+                # Same pages as the extractor streams, so the document is chunked the same way
+                pages = self.__iter_pages(cached_pages)
+            else:
+                pages = extractor.iter_pages(file_url)
+
+            # Pages are chunked and embedded while the next ones are extracted
+            document = await ingest_pages(
+                pages, self.text_splitter, self.embedding_service, self.__content_hash()
+            )
+            if not document:
+                return None
+
+            shared = await asyncio.to_thread(
+                self.document_cache.link, cache_document_key, document.content_key
+            )
+            if shared:
+                span.set_attribute("source", "shared")
+                return shared
+
+            span.set_attribute("source", "indexed")
+            span.set_attribute("chunks", len(document.chunks))
+
+            # Index type is selected by chunk count, rebuilding runs off the event loop
+            with tracer.span("rag.index", chunks=len(document.chunks)):
+                index, keyword_index = await asyncio.gather(
+                    asyncio.to_thread(
+                        finalize_index,
+                        document.index,
+                        self.recall_target,
+                        self.document_cache.vector_encoding,
+                    ),
+                    asyncio.to_thread(KeywordIndex.build, document.chunks),
+                )
+
+            await asyncio.to_thread(
+                self.document_cache.set,
+                cache_document_key,
+                index,
+                document.chunks,
+                content_key=document.content_key,
+                keyword_index=keyword_index,
+            )
+            return (index, document.chunks, keyword_index)
+
+    @staticmethod
+    async def __iter_pages(pages: list[str]) -> AsyncIterator[str]:
+        for page in pages:
+            yield page
+
+    def __retrieve(
+        self,
+        request: str,
+        query_embedding: np.ndarray,
+        documents: list[Tuple[str, Any, Any, Any]],
+    ) -> list[Tuple[str, str]]:
+        """
+        Search every document and merge the candidates across documents: dense candidates are ranked
+        by distance (same embedding model everywhere), keyword candidates by BM25 score, and both
+        rankings are fused. Chunks are addressed by global ids, offset by the preceding documents.
+
+        The fused candidates are over-fetched and re-ranked with MMR on the vectors stored in the
+        indexes, so overlapping neighbour chunks don't crowd out other relevant content.
+
+        Returns:
+            List of (file URL, chunk), best first
+        """
+        offsets = np.cumsum([0] + [len(chunks) for _, _, chunks, _ in documents])
+
+        dense_distances, dense_ids = [], []
+        keyword_scores, keyword_ids = [], []
+
+        for offset, (_, index, _, keyword_index) in zip(offsets, documents):
+            distances, ids = index.search(query_embedding, k=self.fetch_k)
+            found = ids[0] >= 0
+            dense_distances.append(distances[0][found])
+            dense_ids.append(ids[0][found] + offset)
+
+            if keyword_index:
+                scores, ids = keyword_index.search(request, k=self.fetch_k)
+                keyword_scores.append(scores)
+                keyword_ids.append(ids + offset)
+
+        dense_ids = np.concatenate(dense_ids)
+        rankings = [
+            dense_ids[np.argsort(np.concatenate(dense_distances), kind="stable")]
+        ]
+        if keyword_ids:
+            keyword_ids = np.concatenate(keyword_ids)
+            rankings.append(
+                keyword_ids[np.argsort(-np.concatenate(keyword_scores), kind="stable")]
+            )
+
+        fused_scores, candidate_ids = reciprocal_rank_fusion(
+            rankings, k=self.fetch_k * len(documents)
+        )
+        if not len(candidate_ids):
+            return []
+
+        positions = np.searchsorted(offsets, candidate_ids, side="right") - 1
+        local_ids = candidate_ids - offsets[positions]
+
+        embeddings = np.empty(
+            (len(candidate_ids), query_embedding.shape[1]), dtype="float32"
+        )
+        for position in np.unique(positions):
+            in_document = positions == position
+            embeddings[in_document] = documents[position][1].reconstruct_batch(
+                local_ids[in_document]
+            )
+
+        selected = max_marginal_relevance(
+            embeddings,
+            fused_scores / fused_scores[0],
+            k=self.top_k * len(documents),
+            lambda_mult=self.mmr_lambda,
+        )
+
+        return [
+            (documents[positions[i]][0], documents[positions[i]][2][int(local_ids[i])])
+            for i in selected
+        ]
+
+    def __content_hash(self) -> "hashlib._Hash":
+        """SHA-256 of the indexing config, to be updated with the document text."""
+        config = (
+            f"{self.embedding_service.model_name}|{_CHUNK_SIZE}|{_CHUNK_OVERLAP}|"
+            f"{self.document_cache.vector_encoding.value}|{self.recall_target.value}|"
+        )
+        return hashlib.sha256(config.encode("utf-8"))
+
+    def __augmentation(
+        self, request: str, retrieved: list[Tuple[str, str]], with_sources: bool
+    ) -> str:
+        budget_chars = self.context_token_budget * _CHARS_PER_TOKEN
+        context_chunks = []
+
+        for file_url, chunk in retrieved:
+            text = f"[Source: {file_url}]\n{chunk}" if with_sources else chunk
+            # Chunks come best first: skip the ones that don't fit, a shorter one may still fit
+            if len(text) + 1 > budget_chars and context_chunks:
+                continue
+            context_chunks.append(text)
+            budget_chars -= len(text) + 1
 
-    def __augmentation(self, request: str, chunks: list[str]) -> str:
-        rag_context = "\n".join(chunks)
+        rag_context = "\n".join(context_chunks)
         return f"USER QUESTION: {request}\n\n RAG CONTEXT: {rag_context}"
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def max_marginal_relevance(
+    embeddings: np.ndarray,
+    relevance: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+) -> np.ndarray:
+    """
+    Re-rank candidates with Maximal Marginal Relevance:
+    `lambda_mult * relevance - (1 - lambda_mult) * max similarity to already selected candidates`.
+
+    Pairwise cosine similarities are computed in one matrix product, the greedy selection then only
+    updates a vector of max similarities per step.
+
+    Args:
+        embeddings: Candidate embeddings of shape (n, dimension)
+        relevance: Candidate relevance to the query of shape (n,), higher is better, in [0, 1]
+        k: Number of candidates to select
+        lambda_mult: 1 ranks by relevance only, 0 by diversity only
+
+    Returns:
+        Positions of the selected candidates, in selection order
+    """
+    count = len(embeddings)
+    k = min(k, count)
+    if k == 0:
+        return np.empty(0, dtype="int64")
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = embeddings / np.maximum(norms, 1e-12)
+    similarity = normalized @ normalized.T
+
+    selected = np.empty(k, dtype="int64")
+    available = np.ones(count, dtype=bool)
+    max_similarity = np.full(count, -1.0, dtype="float32")
+
+    for step in range(k):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * np.maximum(max_similarity, 0)
+        scores[~available] = -np.inf
+
+        best = int(np.argmax(scores))
+        selected[step] = best
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return selected
@@ -0,0 +1,194 @@
+import importlib.util
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+from aidial_client import AsyncDial
+from aidial_client._auth import process_auth
+from aidial_client._constants import DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT
+from aidial_client._http_client import AsyncHTTPClient
+from utils.structured_logging import get_logger
+
+logger = get_logger("dial_client_registry")
+
+
+@dataclass
+class _ClientEntry:
+    client: AsyncDial
+    last_used: float
+
+
+class DialClientRegistry:
+    """
+    Process-wide source of DIAL clients, so the agent and all tools reuse open connections instead of
+    doing a TCP/TLS handshake on every LLM round, tool call and file download.
+
+    There is one `httpx.AsyncClient` connection pool per endpoint, bounded by `max_connections`, with
+    keep-alive and HTTP/2 (if the `h2` package is installed; HTTP/2 is negotiated over TLS, plain
+    `http://` endpoints stay on HTTP/1.1). When the pool is full, requests wait for a free connection.
+    Idle connections are closed by the pool after `keepalive_expiry`.
+
+    `AsyncDial` clients are cached per endpoint, API version and API key on top of the endpoint pool.
+    Clients unused for `idle_ttl_seconds` are evicted, and the least recently used ones are dropped
+    above `max_clients`. Evicted clients hold no connections of their own, so a caller still using
+    one is not affected. Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 100,
+        keepalive_expiry: float = 30.0,
+        max_clients: int = 1000,
+        idle_ttl_seconds: float = 300.0,
+        http2: bool = True,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+    ):
+        """
+        Args:
+            max_connections: Max open connections per endpoint
+            max_keepalive_connections: Max idle connections kept open per endpoint
+            keepalive_expiry: Seconds after which an idle connection is closed
+            max_clients: Max cached clients over all endpoints, API versions and API keys
+            idle_ttl_seconds: Seconds after which an unused client is evicted
+            http2: Use HTTP/2 if `h2` is installed
+            max_retries: Retries of failed requests
+            timeout: Request timeout; `timeout.pool` bounds the wait for a free connection
+        """
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("http2_unavailable", reason="`h2` is not installed, using HTTP/1.1")
+            http2 = False
+
+        self.http2 = http2
+        self.max_clients = max_clients
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._http_clients: dict[str, httpx.AsyncClient] = {}
+        self._clients: OrderedDict[tuple[str, Optional[str], str], _ClientEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._next_sweep = time.monotonic() + idle_ttl_seconds
+
+    def get_async_client(
+        self, endpoint: str, api_key: str, api_version: Optional[str] = None
+    ) -> AsyncDial:
+        """
+        Return the cached client for the endpoint, API version and API key, creating it on first use.
+
+        Args:
+            endpoint: DIAL Core URL
+            api_key: API key of the request
+            api_version: Default API version of the client requests
+
+        Returns:
+            `AsyncDial` sharing the connection pool of the endpoint
+        """
+        key = (endpoint, api_version, api_key)
+        now = time.monotonic()
+
+        with self._lock:
+            if now >= self._next_sweep:
+                self.__evict_idle(now)
+
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._hits += 1
+                entry.last_used = now
+                self._clients.move_to_end(key)
+                return entry.client
+
+            self._misses += 1
+            client = self.__create_client(endpoint, api_key, api_version)
+            self._clients[key] = _ClientEntry(client=client, last_used=now)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self._evictions += 1
+
+            return client
+
+    def stats(self) -> dict[str, Any]:
+        """Return client cache counters and connection pool occupancy per endpoint."""
+        with self._lock:
+            pools = {
+                endpoint: self.__pool_stats(http_client)
+                for endpoint, http_client in self._http_clients.items()
+            }
+            return {
+                "clients": len(self._clients),
+                "max_clients": self.max_clients,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "pools": pools,
+            }
+
+    async def aclose(self) -> None:
+        """Close all connection pools. Called on app shutdown."""
+        with self._lock:
+            http_clients = list(self._http_clients.values())
+            self._http_clients.clear()
+            self._clients.clear()
+
+        for http_client in http_clients:
+            await http_client.aclose()
+
+    def __create_client(
+        self, endpoint: str, api_key: str, api_version: Optional[str]
+    ) -> AsyncDial:
+        http_client = self._http_clients.get(endpoint)
+        if http_client is None:
+            http_client = httpx.AsyncClient(limits=self._limits, http2=self.http2)
+            self._http_clients[endpoint] = http_client
+
+        auth_type, auth_value = process_auth(api_key=api_key, bearer_token=None)
+        return AsyncDial(
+            base_url=endpoint,
+            api_key=api_key,
+            api_version=api_version,
+            http_client=AsyncHTTPClient(
+                base_url=endpoint,
+                auth_value=auth_value,
+                auth_type=auth_type,
+                max_retries=self.max_retries,
+                timeout=self.timeout,
+                internal_http_client=http_client,
+            ),
+        )
+
+    def __evict_idle(self, now: float) -> None:
+        # Entries are in least recently used order, so idle ones are at the front
+        while self._clients:
+            key, entry = next(iter(self._clients.items()))
+            if now - entry.last_used < self.idle_ttl_seconds:
+                break
+            del self._clients[key]
+            self._evictions += 1
+
+        self._next_sweep = now + min(self.idle_ttl_seconds, 60.0)
+
+    def __pool_stats(self, http_client: httpx.AsyncClient) -> dict[str, int]:
+        # httpx doesn't expose the pool of its default transport, read it from httpcore
+        pool = getattr(http_client._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        requests = list(getattr(pool, "_requests", []))
+
+        return {
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            "queued": sum(1 for request in requests if request.is_queued()),
+            "max_connections": self._limits.max_connections,
+        }
@@ -1,65 +1,339 @@
+import asyncio
+import hashlib
 import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import AsyncIterator, Optional
 
-import pandas as pd
-import pdfplumber
-from aidial_client import Dial
+from aidial_client import AsyncDial
 from aidial_client.types.file import FileDownloadResponse
-from bs4 import BeautifulSoup
+from utils.dial_client_registry import DialClientRegistry
+from utils.extracted_text_cache import CacheEntry, ExtractedTextCache
+from utils.lazy_csv_text import LazyCsvText
+from utils.lazy_pdf_text import LazyPdfText
+from utils.startup import import_modules, lazy_import
+from utils.structured_logging import get_logger
+
+bs4 = lazy_import("bs4")
+pd = lazy_import("pandas")
+pdfplumber = lazy_import("pdfplumber")
+
+logger = get_logger("file_content_extractor")
+
+# Extensions whose parsing is CPU-bound and is therefore off-loaded to the process pool.
+_PROCESS_POOL_EXTENSIONS = {".csv", ".html", ".htm"}
+
+_PARSE_MAX_WORKERS = int(
+    os.getenv("FILE_PARSE_MAX_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+_MAX_CONCURRENT_EXTRACTIONS = int(os.getenv("FILE_EXTRACTION_CONCURRENCY", "4"))
+
+_parse_executor: Optional[ProcessPoolExecutor] = None
+_extraction_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_parse_executor() -> ProcessPoolExecutor:
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ProcessPoolExecutor(max_workers=_PARSE_MAX_WORKERS)
+    return _parse_executor
+
+
+def _get_extraction_semaphore() -> asyncio.Semaphore:
+    global _extraction_semaphore
+    if _extraction_semaphore is None:
+        _extraction_semaphore = asyncio.Semaphore(_MAX_CONCURRENT_EXTRACTIONS)
+    return _extraction_semaphore
+
+
+def warm_up() -> None:
+    """Import the parsing libraries ahead of the first extracted file."""
+    import_modules("pandas", "tabulate", "pdfplumber", "bs4")
+
+
+def _extract_text(file_content: bytes, file_extension: str, filename: str) -> str:
+    """Extract text content based on file type."""
+    try:
+        if file_extension == ".txt":
+            return file_content.decode("utf-8", errors="ignore")
+
+        if file_extension == ".pdf":
+            pdf_bytes = io.BytesIO(file_content)
+            pdf = pdfplumber.open(pdf_bytes)
+
+            content = []
+            for page in pdf.pages:
+                content.append(page.extract_text())
+
+            return "\n".join(content)
+
+        if file_extension == ".csv":
+            buffer = io.StringIO(file_content.decode("utf-8", errors="ignore"))
+            data_frame = pd.read_csv(buffer)
+            markdown = data_frame.to_markdown(index=False)
+            return markdown or ""
+
+        if file_extension in [".html", ".htm"]:
+            soup = bs4.BeautifulSoup(
+                markup=file_content.decode("utf-8", errors="ignore"),
+                features="html.parser",
+            )
+
+            for script in soup(["script", "style"]):
+                script.decompose()
+
+            return soup.get_text(separator="\n", strip=True)
+
+        return file_content.decode("utf-8", errors="ignore")
+    except Exception as e:
+        logger.warning("file_parse_failed", file_name=filename, error=str(e))
+        return ""
+
+
+@dataclass
+class TextPage:
+    text: str
+    page_count: int
+    """Exact page count, or an estimation if `is_exact` is False (file is not fully read yet)."""
+    is_exact: bool
 
 
 class DialFileContentExtractor:
-    def __init__(self, endpoint: str, api_key: str):
-        self.dial_client = Dial(base_url=endpoint, api_key=api_key)
+    def __init__(
+        self,
+        endpoint: str,
+        api_key: str,
+        text_cache: Optional[ExtractedTextCache] = None,
+        client_registry: Optional[DialClientRegistry] = None,
+    ):
+        # Pooled client if a registry is given, so extractions don't open new connections per file
+        self.async_dial_client = (
+            client_registry.get_async_client(endpoint=endpoint, api_key=api_key)
+            if client_registry
+            else AsyncDial(base_url=endpoint, api_key=api_key)
+        )
+        self.text_cache = text_cache
 
-    def extract_text(self, file_url: str) -> str:
-        file: FileDownloadResponse = self.dial_client.files.download(file_url)
+    async def get_cached_pages(self, file_url: str) -> Optional[list[str]]:
+        """
+        Return all pages of the file if its whole text is cached, without downloading the file.
+        The pages are the same as `iter_pages` yields.
+        """
+        _, cached = await self.__get_cached(file_url)
 
-        file_name = file.filename
-        file_extension = Path(file_name).suffix.lower()
+        if isinstance(cached, LazyPdfText):
+            if not cached.is_complete:
+                return None
+            return [cached.page(page_number) for page_number in range(cached.page_count)]
+        if isinstance(cached, LazyCsvText):
+            return None if cached.full_text is None else [cached.full_text]
+        return None if cached is None else [cached]
+
+    async def iter_pages(self, file_url: str) -> AsyncIterator[str]:
+        """
+        Stream the file text page by page, so the caller can process pages while the next ones are
+        parsed. Joined with "\n", the pages are the whole text of the file.
+
+        Big PDFs are parsed in batches in the process pool, small ones in one serial pass (see
+        `LazyPdfText`), continuing a partially read cached PDF. Other file types are yielded as a
+        single page.
+        """
+        cache_key, cached = await self.__get_cached(file_url)
+        loop = asyncio.get_running_loop()
+
+        if cached is None:
+            async with _get_extraction_semaphore():
+                file_name, file_extension, content = await self.__download(file_url)
+                cache_key, cached = self.__get_cached_by_content(
+                    file_url, cache_key, content
+                )
+
+                if cached is None and file_extension == ".pdf":
+                    try:
+                        cached = await LazyPdfText.open(content, _get_parse_executor())
+                    except Exception as e:
+                        logger.warning("file_parse_failed", file_name=file_name, error=str(e))
+                        return
+
+                    if cache_key:
+                        self.text_cache.set(cache_key, cached)
+                elif cached is None:
+                    cached = await self.__parse(
+                        content, file_extension, file_name, cache_key
+                    )
 
-        content = file.get_content()
+        if isinstance(cached, LazyPdfText):
+            page_number = 0
+            while page_number < cached.page_count:
+                if page_number >= cached.extracted_page_count:
+                    # Batches of all pool workers at once, the semaphore is not held while the caller consumes pages
+                    async with _get_extraction_semaphore():
+                        if not await cached.extract_next(batches=_PARSE_MAX_WORKERS):
+                            return
+                    self.__update_cached(cache_key, cached)
 
-        return self.__extract_text(
-            file_content=content, file_extension=file_extension, filename=file_name
+                yield cached.page(page_number)
+                page_number += 1
+        elif isinstance(cached, LazyCsvText):
+            if cached.full_text is None:
+                # Kept in the entry, so row-window pages of paginated requests stay the same
+                cached.full_text = await loop.run_in_executor(
+                    _get_parse_executor(), _extract_text, cached.content, ".csv", file_url
+                )
+                if cache_key:
+                    self.text_cache.set(cache_key, cached)
+            yield cached.full_text
+        elif cached:
+            yield cached
+
+    async def extract_page(self, file_url: str, page: int, page_size: int) -> TextPage:
+        """
+        Extract one page of the file text. Files that fit into one page are returned whole for any page.
+
+        Pages are read lazily, and if `text_cache` is set, the partially read file is cached, so the
+        next page continues from where the previous request stopped:
+        - PDF: a page is `page_size` characters of the text, only PDF pages needed to cover it are parsed;
+        - CSV: a page is a markdown table of the rows that fit into `page_size`, only these rows are read;
+        - other file types are extracted as a whole and sliced.
+        """
+        cache_key, cached = await self.__get_cached(file_url)
+
+        async with _get_extraction_semaphore():
+            loop = asyncio.get_running_loop()
+
+            if cached is None:
+                file_name, file_extension, content = await self.__download(file_url)
+                cache_key, cached = self.__get_cached_by_content(
+                    file_url, cache_key, content
+                )
+
+                if cached is None and file_extension in [".pdf", ".csv"]:
+                    try:
+                        if file_extension == ".pdf":
+                            cached = await LazyPdfText.open(
+                                content, _get_parse_executor()
+                            )
+                        else:
+                            cached = LazyCsvText(content, page_size)
+                    except Exception as e:
+                        logger.warning("file_parse_failed", file_name=file_name, error=str(e))
+                        cached = ""
+
+                    if cache_key and cached:
+                        self.text_cache.set(cache_key, cached)
+                elif cached is None:
+                    cached = await self.__parse(
+                        content, file_extension, file_name, cache_key
+                    )
+
+            if isinstance(cached, LazyCsvText):
+                text = await loop.run_in_executor(None, cached.page, page)
+                if not text and cached.estimated_page_count() == 1:
+                    text = await loop.run_in_executor(None, cached.page, 1)
+
+                return TextPage(
+                    text=text,
+                    page_count=cached.estimated_page_count(),
+                    is_exact=cached.is_complete,
+                )
+
+            start = (page - 1) * page_size
+            if isinstance(cached, str):
+                if len(cached) <= page_size:
+                    start = 0
+
+                return TextPage(
+                    text=cached[start : start + page_size],
+                    page_count=-(-len(cached) // page_size),
+                    is_exact=True,
+                )
+
+            text = await cached.text_range(start, start + page_size)
+            if cached.is_complete and cached.extracted_length <= page_size:
+                text = await cached.text_range(0, page_size)
+
+        self.__update_cached(cache_key, cached)
+
+        total_length = max(cached.estimated_length(), cached.extracted_length)
+        return TextPage(
+            text=text,
+            page_count=-(-total_length // page_size),
+            is_exact=cached.is_complete,
         )
 
-    def __extract_text(
-        self, file_content: bytes, file_extension: str, filename: str
+    async def __parse(
+        self,
+        content: bytes,
+        file_extension: str,
+        file_name: str,
+        cache_key: Optional[str],
     ) -> str:
-        """Extract text content based on file type."""
-        try:
-            if file_extension == ".txt":
-                return file_content.decode("utf-8", errors="ignore")
+        executor = (
+            _get_parse_executor() if file_extension in _PROCESS_POOL_EXTENSIONS else None
+        )
+        text = await asyncio.get_running_loop().run_in_executor(
+            executor, _extract_text, content, file_extension, file_name
+        )
 
-            if file_extension == ".pdf":
-                pdf_bytes = io.BytesIO(file_content)
-                pdf = pdfplumber.open(pdf_bytes)
+        if cache_key and text:
+            self.text_cache.set(cache_key, text)
 
-                content = []
-                for page in pdf.pages:
-                    content.append(page.extract_text())
+        return text
 
-                return "\n".join(content)
+    def __update_cached(self, cache_key: Optional[str], cached: LazyPdfText) -> None:
+        """
+        Set a PDF again after reading more pages, so the cache accounts its new size. A fully read
+        PDF stays cached page by page, so its text is split into the same pages on every read.
+        """
+        if cache_key:
+            self.text_cache.set(cache_key, cached)
 
-            if file_extension == ".csv":
-                buffer = io.StringIO(file_content.decode("utf-8", errors="ignore"))
-                data_frame = pd.read_csv(buffer)
-                markdown = data_frame.to_markdown(index=False)
-                return markdown or ""
+    async def __download(self, file_url: str) -> tuple[str, str, bytes]:
+        file: FileDownloadResponse = await self.async_dial_client.files.download(
+            file_url
+        )
 
-            if file_extension in [".html", ".htm"]:
-                soup = BeautifulSoup(
-                    markup=file_content.decode("utf-8", errors="ignore"),
-                    features="html.parser",
-                )
+        file_name = file.filename
+        file_extension = Path(file_name).suffix.lower()
 
-                for script in soup(["script", "style"]):
-                    script.decompose()
+        content = await file.aget_content()
 
-                return soup.get_text(separator="\n", strip=True)
+        return file_name, file_extension, content
 
-            return file_content.decode("utf-8", errors="ignore")
+    async def __get_cached(
+        self, file_url: str
+    ) -> tuple[Optional[str], Optional[CacheEntry]]:
+        """Look up the cache by file ETag. Returns cache key (None if ETag is unknown) and cached entry."""
+        if not self.text_cache:
+            return None, None
+
+        etag = await self.__get_etag(file_url)
+        if not etag:
+            return None, None
+
+        cache_key = ExtractedTextCache.make_key(file_url, etag)
+        return cache_key, self.text_cache.get(cache_key)
+
+    def __get_cached_by_content(
+        self, file_url: str, cache_key: Optional[str], content: bytes
+    ) -> tuple[Optional[str], Optional[CacheEntry]]:
+        """Look up the cache by content hash when ETag is not available."""
+        if not self.text_cache:
+            return None, None
+
+        if not cache_key:
+            cache_key = ExtractedTextCache.make_key(
+                file_url, hashlib.sha256(content).hexdigest()
+            )
+
+        return cache_key, self.text_cache.get(cache_key)
+
+    async def __get_etag(self, file_url: str) -> Optional[str]:
+        try:
+            metadata = await self.async_dial_client.files.get_metadata(file_url)
+            return metadata.etag
         except Exception as e:
-            print(f"Error while parsing {filename}: {e}")
-            return ""
+            logger.warning("file_metadata_failed", file_url=file_url, error=str(e))
+            return None
@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+
+from utils.lazy_csv_text import LazyCsvText
+from utils.lazy_pdf_text import LazyPdfText
+from utils.structured_logging import get_logger
+
+logger = get_logger("extracted_text_cache")
+
+CacheEntry = str | LazyPdfText | LazyCsvText
+
+
+class ExtractedTextCache:
+    """
+    Thread-safe, size-bounded LRU cache of extracted file text.
+    Entries are keyed by file URL plus file version (ETag or content hash), so an updated file
+    never returns stale text. Least recently used entries are evicted once the total amount
+    of cached characters exceeds `max_size_chars`.
+
+    Besides extracted text, an entry can hold a `LazyPdfText`, kept page by page also once fully
+    read, or a partially read `LazyCsvText`. Their text counts towards `max_size_chars`, the file bytes they keep to continue reading towards
+    a separate `max_source_bytes` budget, so a big file can be paged through without crowding out
+    the extracted texts. A lazy entry grows as it is read, so it is `set` again after reading to
+    update its size.
+    """
+
+    def __init__(
+        self, max_size_chars: int = 50_000_000, max_source_bytes: int = 2 * 1024**3
+    ):
+        """
+        Args:
+            max_size_chars: Max characters of cached text
+            max_source_bytes: Max file bytes kept by partially read files
+        """
+        self._cache: OrderedDict[str, CacheEntry] = OrderedDict()
+        # Characters and source bytes of every entry when it was set, lazy entries grow as they are read
+        self._sizes: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._max_size_chars = max_size_chars
+        self._max_source_bytes = max_source_bytes
+        self._size_chars = 0
+        self._source_bytes = 0
+
+    @staticmethod
+    def make_key(file_url: str, version: str) -> str:
+        """
+        Build a cache key.
+
+        Args:
+            file_url: DIAL file URL
+            version: File ETag or hash of the file content
+        """
+        return f"{file_url}#{version}"
+
+    def get(self, key: str) -> CacheEntry | None:
+        """
+        Retrieve cached text and mark it as recently used.
+
+        Returns:
+            Extracted text (or lazily read file) if found, None otherwise
+        """
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+            return text
+
+    def set(self, key: str, text: CacheEntry) -> None:
+        """
+        Store extracted text, evicting least recently used entries if a size limit is exceeded.
+        Entries bigger than a whole budget are not stored, and drop the earlier entry of the key.
+        """
+        size_chars, source_bytes = self._entry_size(text)
+
+        with self._lock:
+            if key in self._cache:
+                del self._cache[key]
+                self.__release(key)
+
+            if size_chars > self._max_size_chars or source_bytes > self._max_source_bytes:
+                logger.warning(
+                    "extracted_text_not_cached",
+                    key=key,
+                    size_chars=size_chars,
+                    source_bytes=source_bytes,
+                )
+                return
+
+            self._cache[key] = text
+            self._sizes[key] = (size_chars, source_bytes)
+            self._size_chars += size_chars
+            self._source_bytes += source_bytes
+
+            while (
+                self._size_chars > self._max_size_chars
+                or self._source_bytes > self._max_source_bytes
+            ):
+                evicted_key, _ = self._cache.popitem(last=False)
+                self.__release(evicted_key)
+
+    @staticmethod
+    def _entry_size(entry: CacheEntry) -> tuple[int, int]:
+        if isinstance(entry, str):
+            return len(entry), 0
+        return entry.text_size, entry.source_bytes
+
+    def __release(self, key: str) -> None:
+        size_chars, source_bytes = self._sizes.pop(key)
+        self._size_chars -= size_chars
+        self._source_bytes -= source_bytes
+
+    def clear(self) -> None:
+        """Clear all cached entries."""
+        with self._lock:
+            self._cache.clear()
+            self._sizes.clear()
+            self._size_chars = 0
+            self._source_bytes = 0
+
+    def size(self) -> int:
+        """Return the number of cached entries."""
+        with self._lock:
+            return len(self._cache)
+
+    def size_chars(self) -> int:
+        """Return the total number of cached characters."""
+        with self._lock:
+            return self._size_chars
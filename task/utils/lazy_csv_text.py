@@ -0,0 +1,172 @@
+import io
+import threading
+from typing import Optional
+
+from utils.startup import lazy_import
+
+pd = lazy_import("pandas")
+
+
+def _scan_rows(data: bytes, offset: int, max_rows: int) -> tuple[list[int], int]:
+    """
+    Find ends of up to `max_rows` CSV rows starting at `offset`.
+    Newlines inside quoted fields are respected (a row ends on a newline with an even quote count).
+
+    Returns:
+        Byte offsets where the non-empty rows end, and the offset where scanning stopped
+    """
+    row_ends = []
+    position = offset
+
+    while position < len(data) and len(row_ends) < max_rows:
+        row_start = position
+        quotes = 0
+
+        while True:
+            newline = data.find(b"\n", position)
+            if newline == -1:
+                quotes += data.count(b'"', position)
+                position = len(data)
+                break
+
+            quotes += data.count(b'"', position, newline)
+            position = newline + 1
+            if quotes % 2 == 0:
+                break
+
+        if data[row_start:position].strip():
+            row_ends.append(position)
+
+    return row_ends, position
+
+
+class LazyCsvText:
+    """
+    Renders a CSV file as markdown, page by page.
+
+    Every page is a separate markdown table (with the header) of consecutive rows that fits into
+    `page_size` characters. Rows are read in blocks, and only for the pages that are requested,
+    so the whole table is never rendered at once. Byte offsets of page starts are indexed, so a page
+    that was already located is rendered by seeking straight to its rows. A CSV without data rows
+    is one page with the header only.
+
+    The whole table rendered at once (e.g. for indexing) is kept in `full_text` once set, so it is
+    rendered only once per cached file.
+    Not async: run the blocking methods in an executor. Thread-safe.
+    """
+
+    _ROWS_PER_BLOCK = 500
+
+    def __init__(self, csv_bytes: bytes, page_size: int):
+        self.content = csv_bytes
+        self.source_size = len(csv_bytes)
+        self.full_text: Optional[str] = None
+        self._page_size = page_size
+
+        header_ends, _ = _scan_rows(csv_bytes, 0, 1)
+        header_end = header_ends[0] if header_ends else len(csv_bytes)
+        self._header = csv_bytes[:header_end]
+
+        # Byte offset of every located page start, the last one is where the next page starts
+        self._page_offsets = [header_end]
+        self._scanned_to_end = not self._header.strip()
+        self._lock = threading.Lock()
+
+    @property
+    def text_size(self) -> int:
+        """Characters of the whole rendered table, once set."""
+        return len(self.full_text or "")
+
+    @property
+    def source_bytes(self) -> int:
+        """Bytes of the CSV file, kept to render pages on demand."""
+        return self.source_size
+
+    @property
+    def is_complete(self) -> bool:
+        """True if all pages are located."""
+        return self._scanned_to_end
+
+    def estimated_page_count(self) -> int:
+        """Exact page count if all pages are located, otherwise extrapolated by the bytes scanned so far."""
+        with self._lock:
+            located_pages = len(self._page_offsets) - 1
+
+            if self._scanned_to_end or not located_pages:
+                return located_pages
+
+            scanned = self._page_offsets[-1] - self._page_offsets[0]
+            total = self.source_size - self._page_offsets[0]
+            return max(located_pages + 1, -(-located_pages * total // scanned))
+
+    def page(self, page_number: int) -> str:
+        """Render the markdown table of the page (1-based). Returns empty string if the page doesn't exist."""
+        with self._lock:
+            rendered = None
+            while len(self._page_offsets) - 1 < page_number and not self._scanned_to_end:
+                rendered = self.__locate_next_page()
+
+            if page_number < 1 or page_number > len(self._page_offsets) - 1:
+                return ""
+
+            if rendered is not None and page_number == len(self._page_offsets) - 1:
+                return rendered
+
+            start = self._page_offsets[page_number - 1]
+            end = self._page_offsets[page_number]
+            return self.__render(self.__read_rows(start, end))
+
+    def __locate_next_page(self) -> str | None:
+        """Find where the next page ends, index it and return its markdown."""
+        start = self._page_offsets[-1]
+        row_ends: list[int] = []
+        position = start
+
+        while True:
+            block_ends, position = _scan_rows(
+                self.content, position, self._ROWS_PER_BLOCK
+            )
+            row_ends.extend(block_ends)
+
+            if not row_ends:
+                self._scanned_to_end = True
+                if len(self._page_offsets) > 1:
+                    return None
+
+                # No data rows at all, the header is the only page
+                self._page_offsets.append(start)
+                return self.__render(self.__read_rows(start, start))
+
+            frame = self.__read_rows(start, row_ends[-1])
+            lines = self.__render(frame).split("\n")
+
+            # Two header lines, then exactly one line per row
+            size = len(lines[0]) + len(lines[1]) + 1
+            rows = 0
+            for line in lines[2:]:
+                if rows and size + len(line) + 1 > self._page_size:
+                    break
+                size += len(line) + 1
+                rows += 1
+
+            if rows < len(row_ends) or position >= len(self.content):
+                break
+
+        end = row_ends[rows - 1]
+        self._page_offsets.append(end)
+        if rows == len(row_ends) and position >= len(self.content):
+            self._scanned_to_end = True
+
+        return self.__render(frame.iloc[:rows])
+
+    def __read_rows(self, start: int, end: int) -> "pd.DataFrame":
+        return pd.read_csv(
+            io.BytesIO(self._header + self.content[start:end]),
+            encoding_errors="ignore",
+        )
+
+    @staticmethod
+    def __render(frame: "pd.DataFrame") -> str:
+        # New lines inside of cells would break the one-line-per-row markdown table
+        frame = frame.replace(r"\r?\n", " ", regex=True)
+        return frame.to_markdown(index=False) or ""
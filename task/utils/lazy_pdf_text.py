@@ -0,0 +1,285 @@
+import asyncio
+import bisect
+import io
+import os
+import weakref
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from utils.startup import lazy_import
+
+if TYPE_CHECKING:
+    from pdfplumber.pdf import PDF
+
+pdfplumber = lazy_import("pdfplumber")
+
+# Pages parsed by one pool task. Bigger batches cost fewer round trips to the pool, smaller ones
+# parse less ahead of what a paginated request needs.
+_PAGES_PER_BATCH = int(os.getenv("PDF_PAGES_PER_BATCH", "8"))
+# PDFs with fewer pages are parsed in one serial pass in the server process: shared memory and pool
+# round trips are not worth it for them.
+_PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "50"))
+
+
+class _SharedMemoryStream(io.RawIOBase):
+    """Read-only, seekable zero-copy stream over a shared memory buffer."""
+
+    def __init__(self, buffer: memoryview):
+        self._buffer = buffer
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        size = min(len(b), len(self._buffer) - self._position)
+        if size <= 0:
+            return 0
+        b[:size] = self._buffer[self._position : self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = len(self._buffer) + offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        self._buffer.release()
+        super().close()
+
+
+@contextmanager
+def _open_shared_pdf(shm_name: str, size: int) -> Iterator["PDF"]:
+    shm = SharedMemory(name=shm_name)
+    stream = io.BufferedReader(_SharedMemoryStream(shm.buf[:size]))
+    try:
+        with pdfplumber.open(stream) as pdf:
+            yield pdf
+    finally:
+        # Views of the shared buffer must be released before the segment is closed
+        stream.close()
+        shm.close()
+
+
+def _extract_pdf_pages(shm_name: str, size: int, first_page: int, last_page: int) -> list[str]:
+    """Process pool worker: open the PDF from shared memory and extract pages `[first_page, last_page)`."""
+    with _open_shared_pdf(shm_name, size) as pdf:
+        content = []
+        for page in pdf.pages[first_page:last_page]:
+            content.append(page.extract_text() or "")
+            page.close()
+
+        return content
+
+
+def _extract_small_pdf(pdf_bytes: bytes, page_threshold: int) -> tuple[int, Optional[list[str]]]:
+    """
+    Count the pages of the PDF and, if there are fewer than `page_threshold`, extract them all.
+
+    Returns:
+        Page count, and page texts or None if the PDF is not small
+    """
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        page_count = len(pdf.pages)
+        if page_count >= page_threshold:
+            return page_count, None
+
+        content = []
+        for page in pdf.pages:
+            content.append(page.extract_text() or "")
+            page.close()
+
+        return page_count, content
+
+
+def _release(shm: SharedMemory) -> None:
+    shm.close()
+    shm.unlink()
+
+
+class LazyPdfText:
+    """
+    Incrementally extracts text from a PDF, page by page, in a process pool.
+
+    PDFs below `PDF_PARALLEL_PAGE_THRESHOLD` pages are extracted whole when opened, in one serial
+    pass off the event loop. Bigger ones are copied once into shared memory, and pool workers open it from there to parse batches
+    of `PDF_PAGES_PER_BATCH` pages, so parsing doesn't hold the GIL of the server process and the
+    file is not pickled per task. Pages are parsed only when a caller needs them, and a
+    character-offset index of the already extracted pages is kept, so the text is addressed exactly
+    as if it was `"\\n".join(pages)` of the whole document. Extraction continues from the last parsed
+    page on the next request. The shared memory is released as soon as all pages are extracted, or
+    when the object is garbage collected. Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        shm: Optional[SharedMemory],
+        source_size: int,
+        page_count: int,
+        executor: Executor,
+        pages: Optional[list[str]] = None,
+    ):
+        """Use `open` to create an instance."""
+        self.source_size = source_size
+        self._shm = shm
+        self._finalizer = weakref.finalize(self, _release, shm) if shm else None
+        self._page_count = page_count
+        self._executor = executor
+        self._pages: list[str] = []
+        self._offsets: list[int] = []
+        self._length = 0
+        self._lock = asyncio.Lock()
+
+        for page_text in pages or []:
+            self.__add_page(page_text)
+
+        if self.is_complete:
+            self.close()
+
+    @classmethod
+    async def open(cls, pdf_bytes: bytes, executor: Executor) -> "LazyPdfText":
+        """
+        Count the pages of the PDF. A small PDF is extracted right away, a big one is copied into
+        shared memory for the pool.
+
+        Args:
+            pdf_bytes: PDF file content
+            executor: Process pool that parses the pages
+
+        Raises:
+            Exception: If the file is not a valid PDF
+        """
+        size = len(pdf_bytes)
+        page_count, pages = await asyncio.get_running_loop().run_in_executor(
+            None, _extract_small_pdf, pdf_bytes, _PARALLEL_PAGE_THRESHOLD
+        )
+        if pages is not None:
+            return cls(None, size, page_count, executor, pages)
+
+        shm = SharedMemory(create=True, size=max(size, 1))
+        shm.buf[:size] = pdf_bytes
+        return cls(shm, size, page_count, executor)
+
+    @property
+    def page_count(self) -> int:
+        """Total number of pages in the PDF."""
+        return self._page_count
+
+    @property
+    def is_complete(self) -> bool:
+        """True if all pages are extracted."""
+        return len(self._pages) == self._page_count
+
+    @property
+    def extracted_page_count(self) -> int:
+        """Number of pages extracted so far."""
+        return len(self._pages)
+
+    @property
+    def extracted_length(self) -> int:
+        """Number of characters extracted so far."""
+        return self._length
+
+    @property
+    def text_size(self) -> int:
+        """Characters of the extracted text."""
+        return self._length
+
+    @property
+    def source_bytes(self) -> int:
+        """Bytes of the PDF kept in shared memory, until all pages are extracted."""
+        return 0 if self._shm is None else self.source_size
+
+    def estimated_length(self) -> int:
+        """Exact text length if extraction is complete, otherwise extrapolated from the parsed pages."""
+        if self.is_complete or not self._pages:
+            return self._length
+        return self._length * self._page_count // len(self._pages)
+
+    def page(self, page_number: int) -> str:
+        """Return the text of an extracted page (0-based)."""
+        return self._pages[page_number]
+
+    async def extract_next(self, batches: int = 1) -> bool:
+        """
+        Parse the next `batches` batches of pages, in parallel in the pool.
+
+        Returns:
+            False if all pages were already extracted, or the PDF is closed
+        """
+        async with self._lock:
+            first_page = len(self._pages)
+            if first_page >= self._page_count or self._shm is None:
+                return False
+
+            last_page = min(self._page_count, first_page + batches * _PAGES_PER_BATCH)
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(
+                *[
+                    loop.run_in_executor(
+                        self._executor,
+                        _extract_pdf_pages,
+                        self._shm.name,
+                        self.source_size,
+                        start,
+                        min(start + _PAGES_PER_BATCH, last_page),
+                    )
+                    for start in range(first_page, last_page, _PAGES_PER_BATCH)
+                ]
+            )
+
+            for page_texts in results:
+                for page_text in page_texts:
+                    self.__add_page(page_text)
+
+            if self.is_complete:
+                self.close()
+            return True
+
+    async def text_range(self, start: int, end: int) -> str:
+        """Return `text[start:end]`, parsing only as many pages as needed to cover `end`."""
+        while self._length < end and not self.is_complete:
+            # Guess how many pages cover `end` from the average page length, so they are parsed at once
+            missing_pages = (
+                -(-(end - self._length) * len(self._pages) // self._length)
+                if self._length
+                else 1
+            )
+            if not await self.extract_next(-(-missing_pages // _PAGES_PER_BATCH)):
+                break
+
+        if start >= self._length or not self._pages:
+            return ""
+
+        first_page = bisect.bisect_right(self._offsets, start) - 1
+        last_page = bisect.bisect_right(self._offsets, end) - 1
+        text = "\n".join(self._pages[first_page : last_page + 1])
+        page_start = self._offsets[first_page]
+
+        return text[start - page_start : end - page_start]
+
+    def close(self) -> None:
+        """Release the shared memory. Pages that are not extracted yet can't be read afterwards."""
+        self._shm = None
+        if self._finalizer:
+            self._finalizer()
+
+    def __add_page(self, page_text: str) -> None:
+        # Pages are joined with "\n", so every page but the first is shifted by one separator
+        offset = self._length + 1 if self._pages else 0
+        self._offsets.append(offset)
+        self._pages.append(page_text)
+        self._length = offset + len(page_text)
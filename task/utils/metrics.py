@@ -0,0 +1,148 @@
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable
+
+from fastapi import FastAPI, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+# Streams of long answers take minutes, time to first token a few seconds
+_LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120, 300)
+_TOOL_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "agent_llm_time_to_first_token_seconds",
+    "Time from sending a completion request to its first content or tool call delta",
+    ["deployment"],
+    buckets=_LLM_BUCKETS,
+)
+LLM_STREAM_DURATION = Histogram(
+    "agent_llm_stream_duration_seconds",
+    "Time from sending a completion request to the end of its stream",
+    ["deployment"],
+    buckets=_LLM_BUCKETS,
+)
+TOOL_DURATION = Histogram(
+    "agent_tool_duration_seconds",
+    "Tool execution time",
+    ["tool"],
+    buckets=_TOOL_BUCKETS,
+)
+TOOL_CALLS = Counter(
+    "agent_tool_calls",
+    "Tool executions by result: `success`, `error` if the tool raised, `cancelled`",
+    ["tool", "status"],
+)
+TOOL_ROUNDS = Histogram(
+    "agent_tool_rounds",
+    "Tool-calling rounds per request",
+    buckets=(0, 1, 2, 3, 4, 5, 7, 10, 15, 20),
+)
+IN_FLIGHT_REQUESTS = Gauge(
+    "agent_in_flight_requests",
+    "Chat completion requests being processed",
+)
+
+
+async def observe_llm_stream(
+    deployment_name: str, create: Awaitable[AsyncIterable[Any]]
+) -> AsyncIterator[Any]:
+    """
+    Send a streaming completion request and yield its chunks, recording time to first token and
+    total stream time of the deployment.
+
+    Args:
+        deployment_name: Deployment label of the metrics
+        create: Not awaited `chat.completions.create(..., stream=True)` call
+    """
+    start = time.perf_counter()
+    first_token = True
+
+    async for chunk in await create:
+        if first_token and chunk.choices:
+            delta = chunk.choices[0].delta
+            if delta and (delta.content or delta.tool_calls):
+                LLM_TIME_TO_FIRST_TOKEN.labels(deployment_name).observe(
+                    time.perf_counter() - start
+                )
+                first_token = False
+        yield chunk
+
+    LLM_STREAM_DURATION.labels(deployment_name).observe(time.perf_counter() - start)
+
+
+def observe_tool_call(tool_name: str, seconds: float, status: str) -> None:
+    """
+    Args:
+        tool_name: Tool label of the metrics
+        seconds: Execution time
+        status: `success`, `error` or `cancelled`
+    """
+    TOOL_DURATION.labels(tool_name).observe(seconds)
+    TOOL_CALLS.labels(tool_name, status).inc()
+
+
+class StatsCollector(Collector):
+    """
+    Exports the `stats()` counters and sizes of a component at scrape time, so the component
+    doesn't have to know about Prometheus.
+    """
+
+    def __init__(self, prefix: str, stats: Callable[[], dict[str, Any]], counters: set[str]):
+        """
+        Args:
+            prefix: Metric name prefix, e.g. `agent_document_cache`
+            stats: Returns a flat dict of numbers; other values are skipped
+            counters: Keys exported as counters, the rest as gauges
+        """
+        self.prefix = prefix
+        self.stats = stats
+        self.counters = counters
+
+    def collect(self):
+        for key, value in self.stats().items():
+            if not isinstance(value, (int, float)):
+                continue
+
+            name = f"{self.prefix}_{key}"
+            if key in self.counters:
+                yield CounterMetricFamily(name, f"{self.prefix} {key}", value=value)
+            else:
+                yield GaugeMetricFamily(name, f"{self.prefix} {key}", value=value)
+
+
+class ConnectionPoolCollector(Collector):
+    """Exports connection pool occupancy per endpoint from `DialClientRegistry.stats()`."""
+
+    def __init__(self, stats: Callable[[], dict[str, Any]]):
+        self.stats = stats
+
+    def collect(self):
+        pools = self.stats()["pools"]
+        for key in ("connections", "active", "idle", "queued", "max_connections"):
+            metric = GaugeMetricFamily(
+                f"agent_dial_pool_{key}", f"DIAL connection pool {key}", labels=["endpoint"]
+            )
+            for endpoint, pool in pools.items():
+                metric.add_metric([endpoint], pool[key])
+            yield metric
+
+
+def register_collector(collector: Collector) -> None:
+    REGISTRY.register(collector)
+
+
+def add_metrics_route(app: FastAPI, path: str = "/metrics") -> None:
+    """Expose the metrics of the process in the Prometheus text format."""
+
+    async def metrics() -> Response:
+        return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+    app.add_api_route(path, metrics, methods=["GET"], include_in_schema=False)
@@ -1,19 +1,123 @@
-from typing import Optional
+import asyncio
+import os
+from typing import Callable, Optional
 
 from aidial_sdk.chat_completion import Choice, Stage
+from utils.structured_logging import get_logger
+
+logger = get_logger("stage")
+
+# Content deltas are coalesced into one SSE event until this many characters or milliseconds
+# are buffered. Lower values stream more smoothly, higher ones cost less CPU per token. 0 disables buffering.
+_STREAM_FLUSH_SIZE = int(os.getenv("STREAM_FLUSH_SIZE", "512"))
+_STREAM_FLUSH_INTERVAL_MS = float(os.getenv("STREAM_FLUSH_INTERVAL_MS", "20"))
+
+
+class _BufferedContent:
+    """
+    Coalesces `append_content` deltas into fewer chunks.
+
+    Buffered content is written when `flush_size` characters are collected, `flush_interval_ms`
+    after the first buffered delta, or before any other event of the target (attachment, stage,
+    state, close), so the order of events is kept.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[str], None],
+        flush_size: int = _STREAM_FLUSH_SIZE,
+        flush_interval_ms: float = _STREAM_FLUSH_INTERVAL_MS,
+    ):
+        self._write = write
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval_ms / 1000
+        self._parts: list[str] = []
+        self._size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def append_content(self, content: str) -> None:
+        if not content:
+            return
+
+        self._parts.append(content)
+        self._size += len(content)
+
+        if self._size >= self._flush_size or self._flush_interval <= 0:
+            self.flush()
+        elif self._timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+                return
+            self._timer = loop.call_later(self._flush_interval, self.flush)
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._parts:
+            content = "".join(self._parts)
+            self._parts.clear()
+            self._size = 0
+            self._write(content)
+
+
+class BufferedStage(_BufferedContent):
+    """Stage with coalesced content deltas. Content is flushed before attachments and on close."""
+
+    def __init__(self, stage: Stage):
+        super().__init__(stage.append_content)
+        self.stage = stage
+
+    def open(self) -> None:
+        self.stage.open()
+
+    def append_name(self, name: str) -> None:
+        self.flush()
+        self.stage.append_name(name)
+
+    def add_attachment(self, *args, **kwargs) -> None:
+        self.flush()
+        self.stage.add_attachment(*args, **kwargs)
+
+    def close(self, *args, **kwargs) -> None:
+        self.flush()
+        self.stage.close(*args, **kwargs)
+
+
+class BufferedChoice(_BufferedContent):
+    """Choice with coalesced content deltas. Content is flushed before any other choice event."""
+
+    def __init__(self, choice: Choice):
+        super().__init__(choice.append_content)
+        self.choice = choice
+
+    def add_attachment(self, *args, **kwargs) -> None:
+        self.flush()
+        self.choice.add_attachment(*args, **kwargs)
+
+    def create_stage(self, name: Optional[str] = None) -> Stage:
+        self.flush()
+        return self.choice.create_stage(name)
+
+    def set_state(self, state) -> None:
+        self.flush()
+        self.choice.set_state(state)
 
 
 class StageProcessor:
 
     @staticmethod
-    def open_stage(choice: Choice, name: Optional[str] = None) -> Stage:
-        stage = choice.create_stage(name)
+    def open_stage(choice: Choice | BufferedChoice, name: Optional[str] = None) -> BufferedStage:
+        stage = BufferedStage(choice.create_stage(name))
         stage.open()
         return stage
 
     @staticmethod
-    def close_stage_safely(stage: Stage) -> None:
+    def close_stage_safely(stage: BufferedStage) -> None:
         try:
             stage.close()
         except Exception as e:
-            print("⚠️ Unable to close stage. ", e)
+            logger.warning("stage_close_failed", error=str(e))
@@ -0,0 +1,87 @@
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+_timings: dict[str, float] = {}
+_timings_lock = threading.Lock()
+
+
+def _record(name: str, seconds: float) -> None:
+    with _timings_lock:
+        _timings[name] = _timings.get(name, 0.0) + seconds
+
+
+class LazyModule:
+    """
+    Module proxy that imports the module on first attribute access.
+    Heavy dependencies (torch, FAISS, pandas, ...) are then imported when a tool first needs them or
+    by the startup warm-up, not when `app.py` is imported. Import durations go to the startup report.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._load(), attribute)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = import_module(self._name)
+        return self._module
+
+
+def lazy_import(name: str) -> Any:
+    """Return a proxy of the module, the import runs on first attribute access."""
+    return LazyModule(name)
+
+
+def import_module(name: str):
+    """Import the module, recording the duration if it wasn't imported yet."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    with startup_phase(f"import {name}"):
+        return importlib.import_module(name)
+
+
+def import_modules(*names: str) -> None:
+    """Import modules ahead of use, e.g. from a warm-up thread."""
+    for name in names:
+        import_module(name)
+
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """Measure a startup step for the startup report."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def startup_timings() -> dict[str, float]:
+    """Recorded imports and startup phases in milliseconds, slowest first."""
+    with _timings_lock:
+        timings = sorted(_timings.items(), key=lambda item: item[1], reverse=True)
+
+    return {name: round(seconds * 1000, 1) for name, seconds in timings}
+
+
+def startup_report() -> str:
+    """Recorded imports and startup phases, slowest first, as a human-readable table."""
+    lines = ["Startup breakdown:"]
+    lines.extend(f"  {ms:10.1f} ms  {name}" for name, ms in startup_timings().items())
+    return "\n".join(lines)
@@ -0,0 +1,99 @@
+import json
+import re
+from typing import Optional
+
+from aidial_sdk.chat_completion import FunctionCall, ToolCall
+
+# Characters that change the JSON nesting state, everything else is skipped without a Python-level loop
+_STRUCTURAL = re.compile(r'["\\{}\[\]]')
+
+
+class StreamingToolCall:
+    """
+    Tool call assembled from completion stream deltas.
+
+    Argument chunks are scanned as they arrive, tracking the nesting depth and string state of the
+    JSON, so the chunk that closes the top-level object is detected right away, without
+    concatenating and re-parsing the arguments on every delta.
+    """
+
+    def __init__(self, index: int, id: str, name: Optional[str]):
+        self.index = index
+        self.id = id
+        self.name = name
+        self.is_complete = False
+        self._parts: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._invalid = False
+
+    @property
+    def arguments(self) -> str:
+        return "".join(self._parts)
+
+    def append_arguments(self, chunk: Optional[str]) -> bool:
+        """
+        Add an argument chunk.
+
+        Returns:
+            True if the arguments became a complete JSON object with this chunk
+        """
+        if not chunk:
+            return False
+
+        self._parts.append(chunk)
+        if self.is_complete or self._invalid:
+            return False
+
+        # A backslash in a string escapes the next character, which can be the first one of this chunk
+        skip_to = 1 if self._escaped else 0
+        self._escaped = False
+
+        for match in _STRUCTURAL.finditer(chunk, skip_to):
+            start = match.start()
+            if start < skip_to:
+                continue
+            char = match.group()
+
+            if self._in_string:
+                if char == "\\":
+                    if start + 1 == len(chunk):
+                        self._escaped = True
+                    skip_to = start + 2
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth < 0:
+                    self._invalid = True
+                    return False
+                if self._depth == 0:
+                    return self.__complete()
+
+        return False
+
+    def to_tool_call(self) -> ToolCall:
+        return ToolCall(
+            index=self.index,
+            id=self.id,
+            type="function",
+            function=FunctionCall(name=self.name, arguments=self.arguments),
+        )
+
+    def __complete(self) -> bool:
+        try:
+            json.loads(self.arguments)
+        except ValueError:
+            # Not a single top-level value, leave it to the end of the stream
+            self._invalid = True
+            return False
+
+        self.is_complete = True
+        return True
@@ -0,0 +1,143 @@
+import json
+import logging
+import random
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from utils.tracing import tracer
+
+_ROOT_LOGGER = "agent"
+
+# Whether debug records of the current request are sampled in; outside a request they always are
+_debug_sampled: ContextVar[bool] = ContextVar("debug_sampled", default=True)
+_conversation_id: ContextVar[Optional[str]] = ContextVar("conversation_id", default=None)
+_debug_sample_rate = 1.0
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line with the record fields. Field values are serialized
+    only here, so nothing is formatted for disabled records; callables are called to get the value.
+    Strings longer than `max_field_chars`, also nested ones, are truncated.
+    """
+
+    def __init__(self, max_field_chars: int = 2000):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+
+        for key, value in getattr(record, "fields", {}).items():
+            if callable(value):
+                value = value()
+            entry[key] = self.__truncate(value)
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+    def __truncate(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if len(value) > self.max_field_chars:
+                return f"{value[: self.max_field_chars]}... [{len(value) - self.max_field_chars} more chars]"
+            return value
+        if isinstance(value, dict):
+            return {key: self.__truncate(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.__truncate(item) for item in value]
+        return value
+
+
+class StructuredLogger:
+    """
+    Logs an event name with key-value fields. Disabled levels cost one level check, and debug
+    records are only emitted for requests sampled in by `sample_request`. Records of a request carry
+    its conversation ID, and the trace ID of the current span if tracing is on.
+    """
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(f"{_ROOT_LOGGER}.{name}")
+
+    def is_enabled_for(self, level: int) -> bool:
+        if not self._logger.isEnabledFor(level):
+            return False
+        return level > logging.DEBUG or _debug_sampled.get()
+
+    def debug(self, event: str, **fields: Any) -> None:
+        self.__log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        self.__log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self.__log(logging.WARNING, event, fields)
+
+    def error(self, event: str, exc_info: bool = False, **fields: Any) -> None:
+        self.__log(logging.ERROR, event, fields, exc_info=exc_info)
+
+    def __log(self, level: int, event: str, fields: dict[str, Any], exc_info: bool = False) -> None:
+        if not self.is_enabled_for(level):
+            return
+
+        conversation_id = _conversation_id.get()
+        if conversation_id is not None:
+            fields["conversation_id"] = conversation_id
+        span = tracer.current_span()
+        if span is not None:
+            fields["trace_id"] = span.trace_id
+
+        self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields}, stacklevel=3)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(name)
+
+
+def configure_logging(
+    level: str = "INFO", debug_sample_rate: float = 1.0, max_field_chars: int = 2000
+) -> None:
+    """
+    Write JSON log records to stdout.
+
+    Args:
+        level: Min level name, e.g. `DEBUG`
+        debug_sample_rate: Share of requests whose debug records are emitted, 0..1
+        max_field_chars: Max length of a string field value, longer ones are truncated
+    """
+    global _debug_sample_rate
+    _debug_sample_rate = debug_sample_rate
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter(max_field_chars=max_field_chars))
+
+    logger = logging.getLogger(_ROOT_LOGGER)
+    logger.handlers = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+
+@contextmanager
+def sample_request(conversation_id: Optional[str] = None) -> Iterator[bool]:
+    """
+    Decide once per request whether its debug records are emitted. Yields the decision.
+
+    Args:
+        conversation_id: Added to all records of the request, so they correlate without tracing
+    """
+    sampled = _debug_sample_rate >= 1.0 or random.random() < _debug_sample_rate
+    sampled_token = _debug_sampled.set(sampled)
+    conversation_token = _conversation_id.set(conversation_id)
+    try:
+        yield sampled
+    finally:
+        _conversation_id.reset(conversation_token)
+        _debug_sampled.reset(sampled_token)
@@ -0,0 +1,241 @@
+import json
+import logging
+import queue
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start_time: float
+    """Unix time in seconds."""
+    attributes: dict[str, Any] = field(default_factory=dict)
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+    _root: Optional["Span"] = field(default=None, repr=False)
+    _finished: list["Span"] = field(default_factory=list, repr=False)
+
+    @property
+    def is_recording(self) -> bool:
+        return True
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        """Finish the span. Spans of a trace are exported together when its root span ends."""
+        if self.duration_ms is not None:
+            return
+
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+        tracer.on_end(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NonRecordingSpan:
+    """Returned when tracing is disabled or there is no active trace, so callers don't need checks."""
+
+    is_recording = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+_NON_RECORDING_SPAN = _NonRecordingSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class SpanExporter(ABC):
+    """Receives finished spans, grouped by trace. Called on the thread that ended the root span."""
+
+    @abstractmethod
+    def export(self, spans: list[Span]) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """
+    Appends spans to a file, one JSON object per line. Writes happen on a background thread, so
+    exporting doesn't block the event loop.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._queue: queue.SimpleQueue[Optional[list[Span]]] = queue.SimpleQueue()
+        self._writer = threading.Thread(
+            target=self.__write_loop, name="span-exporter", daemon=True
+        )
+        self._writer.start()
+
+    def export(self, spans: list[Span]) -> None:
+        self._queue.put(spans)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def __write_loop(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            while (spans := self._queue.get()) is not None:
+                try:
+                    file.write(
+                        "".join(
+                            json.dumps(span.to_dict(), default=str) + "\n" for span in spans
+                        )
+                    )
+                    file.flush()
+                except Exception as e:
+                    # Not a structured logger: it depends on the tracer
+                    logging.getLogger("agent.tracing").warning(
+                        "span_export_failed", extra={"fields": {"error": str(e)}}
+                    )
+
+
+class Tracer:
+    """
+    Minimal in-process tracer. The current span is kept in a context variable, so asyncio tasks and
+    `asyncio.to_thread` calls started inside a span become its children. Disabled until an exporter
+    is set; disabled tracing costs one attribute check per span.
+    """
+
+    def __init__(self):
+        self.exporter: Optional[SpanExporter] = None
+        self._lock = threading.Lock()
+
+    def set_exporter(self, exporter: Optional[SpanExporter]) -> None:
+        self.exporter = exporter
+
+    def shutdown(self) -> None:
+        if self.exporter:
+            self.exporter.shutdown()
+            self.exporter = None
+
+    @contextmanager
+    def start_trace(
+        self, name: str, trace_id: Optional[str] = None, **attributes: Any
+    ) -> Iterator[Span | _NonRecordingSpan]:
+        """
+        Start a root span and make it current.
+
+        Args:
+            name: Span name
+            trace_id: Trace ID, e.g. propagated from a request header; random if not set
+            attributes: Span attributes
+        """
+        if self.exporter is None:
+            yield _NON_RECORDING_SPAN
+            return
+
+        span = Span(
+            trace_id=trace_id or secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=None,
+            name=name,
+            start_time=time.time(),
+            attributes=attributes,
+        )
+        with self.__activate(span):
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span | _NonRecordingSpan]:
+        """Start a child span of the current span and make it current. Not recording outside a trace."""
+        span = self.start_span(name, **attributes)
+        if not span.is_recording:
+            yield span
+            return
+
+        with self.__activate(span):
+            yield span
+
+    def start_span(self, name: str, **attributes: Any) -> Span | _NonRecordingSpan:
+        """
+        Start a child span of the current span without making it current. The caller must `end()` it.
+        Used for work that doesn't fit a `with` block, e.g. a batch finished by a future callback.
+        """
+        parent = _current_span.get()
+        if parent is None or self.exporter is None:
+            return _NON_RECORDING_SPAN
+
+        return Span(
+            trace_id=parent.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id,
+            name=name,
+            start_time=time.time(),
+            attributes=attributes,
+            _root=parent._root or parent,
+        )
+
+    def current_span(self) -> Optional[Span]:
+        """Return the active span of the current context, None outside a trace."""
+        return _current_span.get()
+
+    def on_end(self, span: Span) -> None:
+        exporter = self.exporter
+        if exporter is None:
+            return
+
+        if span._root is None:
+            with self._lock:
+                spans = span._finished + [span]
+                span._finished = []
+            exporter.export(spans)
+            return
+
+        with self._lock:
+            root_finished = span._root.duration_ms is not None
+            if not root_finished:
+                span._root._finished.append(span)
+
+        if root_finished:
+            # E.g. a cancelled tool call that ended after the request
+            exporter.export([span])
+
+    @contextmanager
+    def __activate(self, span: Span) -> Iterator[None]:
+        token = _current_span.set(span)
+        try:
+            yield
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+
+tracer = Tracer()